@@ -0,0 +1,7 @@
+from ansible_collections.threefold.jsgrid.plugins.plugin_utils.batch import BatchAction
+from ansible_collections.threefold.jsgrid.plugins.module_utils.specs import CONTAINER_ITEM_SPEC
+
+
+class ActionModule(BatchAction):
+    LIST_OPTION = "containers"
+    ITEM_SPEC = CONTAINER_ITEM_SPEC
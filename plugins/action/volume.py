@@ -0,0 +1,9 @@
+from ansible_collections.threefold.jsgrid.plugins.plugin_utils.batch import BatchAction
+from ansible_collections.threefold.jsgrid.plugins.module_utils.specs import VOLUME_ITEM_SPEC
+
+
+class ActionModule(BatchAction):
+    LIST_OPTION = "volumes"
+    # a single volume task can't set a mount point or a group
+    ITEM_SPEC = {key: spec for key, spec in VOLUME_ITEM_SPEC.items() if key not in ["mount_point", "group"]}
+    SHARED_OPTIONS = BatchAction.SHARED_OPTIONS + ["pool_id"]
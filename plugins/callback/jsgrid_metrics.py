@@ -0,0 +1,171 @@
+DOCUMENTATION = r'''
+---
+name: jsgrid_metrics
+type: aggregate
+short_description: aggregates the timings of the jsgrid tasks of a playbook
+version_added: "1.0.0"
+description:
+    - collects the timings returned by the jsgrid modules and prints, per module, the number of tasks, explorer requests and
+      the p50 and p95 of the task duration, the wait time, the work time (duration without waits) and every phase at the end
+      of the playbook.
+    - optionally writes the same metrics to a prometheus textfile (for the node exporter textfile collector) labelled with
+      the playbook and the collection version, so runs of different versions can be compared.
+requirements:
+    - enable in configuration (callbacks_enabled = threefold.jsgrid.jsgrid_metrics)
+options:
+    prometheus_textfile:
+        description: path of the prometheus textfile to write. nothing is written when not set
+        type: str
+        env:
+            - name: JSGRID_METRICS_PROMETHEUS_FILE
+        ini:
+            - section: callback_jsgrid_metrics
+              key: prometheus_textfile
+'''
+
+import json
+import math
+import os
+
+import yaml
+
+from ansible.plugins.callback import CallbackBase
+
+
+QUANTILES = [50, 95]
+COUNTERS = ["total", "explorer_requests"]
+
+
+def percentile(values, p):
+    # nearest rank
+    values = sorted(values)
+    return values[max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)]
+
+
+def collection_version():
+    root = os.path.join(os.path.dirname(__file__), "..", "..")
+    try:
+        with open(os.path.join(root, "MANIFEST.json")) as f:
+            return json.load(f)["collection_info"]["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        with open(os.path.join(root, "galaxy.yml")) as f:
+            return str(yaml.safe_load(f)["version"])
+    except (OSError, yaml.YAMLError, KeyError, TypeError):
+        return "unknown"
+
+
+class ModuleMetrics:
+    def __init__(self):
+        self.tasks = 0
+        self.failures = 0
+        self.explorer_requests = 0
+        self.durations = []
+        self.waits = []
+        self.works = []
+        self.phases = {}
+
+    def add(self, timings, failed):
+        self.tasks += 1
+        self.failures += int(failed)
+        self.explorer_requests += timings.get("explorer_requests", 0)
+        total = timings.get("total", 0.0)
+        wait = timings.get("wait", 0.0)
+        self.durations.append(total)
+        self.waits.append(wait)
+        # waits of concurrent workloads overlap, so they can add up to more than the run
+        self.works.append(max(total - wait, 0.0))
+        for phase, duration in timings.items():
+            if phase not in COUNTERS:
+                self.phases.setdefault(phase, []).append(duration)
+
+    def series(self):
+        series = dict(duration=self.durations, wait=self.waits, work=self.works)
+        for phase, durations in sorted(self.phases.items()):
+            series[f"phase_{phase}"] = durations
+        return series
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'threefold.jsgrid.jsgrid_metrics'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.modules = {}
+        self.playbook = None
+
+    def v2_playbook_on_start(self, playbook):
+        self.playbook = os.path.basename(playbook._file_name)
+
+    def _record(self, result, failed):
+        timings = result._result.get("timings")
+        if not isinstance(timings, dict):
+            return
+        module = result._task.action.split(".")[-1]
+        self.modules.setdefault(module, ModuleMetrics()).add(timings, failed)
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, False)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, True)
+
+    def v2_runner_item_on_ok(self, result):
+        self._record(result, False)
+
+    def v2_runner_item_on_failed(self, result):
+        self._record(result, True)
+
+    def _summary(self):
+        self._display.banner("JSGRID METRICS")
+        for module, metrics in sorted(self.modules.items()):
+            self._display.display(
+                f"{module}: {metrics.tasks} tasks, {metrics.failures} failed, {metrics.explorer_requests} explorer requests"
+            )
+            for name, values in metrics.series().items():
+                quantiles = ", ".join(f"p{p} {percentile(values, p):.3f}s" for p in QUANTILES)
+                self._display.display(f"    {name:<24} {quantiles}, sum {sum(values):.3f}s")
+
+    def _write_textfile(self, path):
+        labels = f'playbook="{self.playbook}",version="{collection_version()}"'
+        lines = [
+            "# HELP jsgrid_tasks_total jsgrid tasks run by the playbook",
+            "# TYPE jsgrid_tasks_total gauge",
+        ]
+        for module, metrics in sorted(self.modules.items()):
+            lines.append(f'jsgrid_tasks_total{{{labels},module="{module}"}} {metrics.tasks}')
+        lines += ["# HELP jsgrid_task_failures_total failed jsgrid tasks", "# TYPE jsgrid_task_failures_total gauge"]
+        for module, metrics in sorted(self.modules.items()):
+            lines.append(f'jsgrid_task_failures_total{{{labels},module="{module}"}} {metrics.failures}')
+        lines += ["# HELP jsgrid_explorer_requests_total explorer requests sent by the jsgrid tasks", "# TYPE jsgrid_explorer_requests_total gauge"]
+        for module, metrics in sorted(self.modules.items()):
+            lines.append(f'jsgrid_explorer_requests_total{{{labels},module="{module}"}} {metrics.explorer_requests}')
+        lines += ["# HELP jsgrid_task_seconds duration, wait, work and phase times of the jsgrid tasks", "# TYPE jsgrid_task_seconds summary"]
+        for module, metrics in sorted(self.modules.items()):
+            for name, values in metrics.series().items():
+                series_labels = f'{labels},module="{module}",series="{name}"'
+                for p in QUANTILES:
+                    lines.append(f'jsgrid_task_seconds{{{series_labels},quantile="{p / 100.0}"}} {percentile(values, p):.3f}')
+                lines.append(f'jsgrid_task_seconds_sum{{{series_labels}}} {sum(values):.3f}')
+                lines.append(f'jsgrid_task_seconds_count{{{series_labels}}} {len(values)}')
+
+        # written then renamed so the collector never reads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.rename(tmp_path, path)
+        except OSError as e:
+            self._display.warning(f"Failed to write the jsgrid metrics to {path}: {e}")
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.modules:
+            return
+        self._summary()
+        path = self.get_option('prometheus_textfile')
+        if path:
+            self._write_textfile(path)
@@ -0,0 +1,196 @@
+DOCUMENTATION = r'''
+---
+name: jsgrid
+plugin_type: inventory
+short_description: TF Grid containers and kubernetes VMs inventory source
+version_added: "1.0.0"
+description:
+    - turns the running container and kubernetes workloads of an identity into hosts.
+    - hosts are grouped by network (network_<name>), pool (pool_<id>), type (type_container, type_kubernetes)
+      and decrypted metadata (tag_<key>_<value>).
+    - the workloads are kept in a cache file under JSGRID_STATE_DIR. every run only fetches the explorer pages holding
+      workloads newer than the newest cached one plus the workloads being or already decommissioned, which are dropped
+      from the cache. the whole list is fetched again every full_sync_interval seconds.
+    - the configuration file name must end with jsgrid.yml or jsgrid.yaml.
+extends_documentation_fragment:
+    - constructed
+options:
+    plugin:
+        description: token that ensures this is a source file for the plugin.
+        required: true
+        choices: ['threefold.jsgrid.jsgrid']
+    identity_name:
+        description: identity whose workloads are listed. defaults to j.core.identity.me
+        required: false
+        type: str
+    types:
+        description: workload types to add as hosts
+        type: list
+        default: [container, kubernetes]
+    full_sync_interval:
+        description: seconds after which the cache is rebuilt from all the workloads
+        type: int
+        default: 3600
+    sync:
+        description: fetch the new workloads from the explorer. when false only the cache is used
+        type: bool
+        default: true
+    hostname_tag:
+        description: metadata key used as the host name. hosts without it are named <type>-<wid>
+        type: str
+        default: name
+'''
+
+EXAMPLES = r'''
+# jsgrid.yml
+plugin: threefold.jsgrid.jsgrid
+identity_name: testnet
+keyed_groups:
+  - key: jsgrid_node_id
+    prefix: node
+'''
+
+import os
+import time
+from urllib.parse import urlparse
+
+from ansible.errors import AnsibleError
+from ansible.inventory.group import to_safe_group_name
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable
+
+try:
+    from jumpscale.loader import j
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_explorer
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.metadata import identity_box, load_metadata
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.workloads import iter_workload_pages
+    HAS_JUMPSCALE = True
+except ImportError:
+    HAS_JUMPSCALE = False
+
+
+INVENTORY_TYPES = ["container", "kubernetes"]
+REMOVED_ACTIONS = ["DELETE", "DELETED"]
+
+
+def workload_entry(workload):
+    entry = dict(
+        wid=workload.id,
+        type=workload.info.workload_type.name.lower(),
+        node_id=workload.info.node_id,
+        pool_id=workload.info.pool_id,
+        next_action=workload.info.next_action.name,
+        description=workload.info.description,
+        metadata=workload.info.metadata,
+        network=None,
+        ip=None,
+    )
+    if entry["type"] == "container":
+        if workload.network_connection:
+            entry["network"] = workload.network_connection[0].network_id
+            entry["ip"] = workload.network_connection[0].ipaddress
+    else:
+        entry["network"] = workload.network_id
+        entry["ip"] = workload.ipaddress
+        entry["role"] = "worker" if workload.master_ips else "master"
+    return entry
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable):
+
+    NAME = 'threefold.jsgrid.jsgrid'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and path.endswith(('jsgrid.yml', 'jsgrid.yaml'))
+
+    def _sync(self, identity):
+        # the cache is locked for the whole sync so concurrent runs don't fetch the same pages
+        explorer = get_explorer(self.get_option('identity_name'))
+        host = urlparse(explorer.url).netloc.replace(":", "_")
+        state = SharedState(os.path.join(STATE_DIR, f"inventory-{host}-{identity.tid}.json"))
+        now = time.time()
+        with state.locked() as data:
+            if not self.get_option('sync'):
+                return dict(data.get("workloads", {}))
+            full = now - data.get("full_sync_at", 0) > self.get_option('full_sync_interval')
+            if full:
+                data.update(workloads={}, watermark=0, page=1, full_sync_at=now)
+            workloads = data["workloads"]
+            watermark = data["watermark"]
+            for page, items in iter_workload_pages(explorer, identity.tid, data["page"]):
+                for workload in items:
+                    if workload.id <= data["watermark"]:
+                        continue
+                    watermark = max(watermark, workload.id)
+                    if workload.info.workload_type.name.lower() in INVENTORY_TYPES:
+                        workloads[str(workload.id)] = workload_entry(workload)
+                if items:
+                    data["page"] = page
+            if not full:
+                # decommissioned workloads keep their wid, so they are never in the pages of the new workloads
+                for next_action in REMOVED_ACTIONS:
+                    for _, items in iter_workload_pages(explorer, identity.tid, 1, next_action=next_action):
+                        for workload in items:
+                            workloads.pop(str(workload.id), None)
+            data["watermark"] = watermark
+            data["synced_at"] = now
+            return dict(workloads)
+
+    def _add_workload(self, entry, metadata, hostname):
+        self.inventory.add_host(hostname)
+        hostvars = dict(
+            ansible_host=entry["ip"],
+            jsgrid_wid=entry["wid"],
+            jsgrid_type=entry["type"],
+            jsgrid_node_id=entry["node_id"],
+            jsgrid_pool_id=entry["pool_id"],
+            jsgrid_network=entry["network"],
+            jsgrid_description=entry["description"],
+            jsgrid_metadata=metadata or {},
+        )
+        if entry.get("role"):
+            hostvars["jsgrid_role"] = entry["role"]
+        for key, value in hostvars.items():
+            self.inventory.set_variable(hostname, key, value)
+
+        groups = [f"type_{entry['type']}", f"pool_{entry['pool_id']}"]
+        if entry["network"]:
+            groups.append(f"network_{entry['network']}")
+        for key, value in (metadata or {}).items():
+            if isinstance(value, (str, int, float, bool)):
+                groups.append(f"tag_{key}_{value}")
+        for group in groups:
+            group = self.inventory.add_group(to_safe_group_name(group))
+            self.inventory.add_child(group, hostname)
+
+        strict = self.get_option('strict')
+        self._set_composite_vars(self.get_option('compose'), hostvars, hostname, strict=strict)
+        self._add_host_to_composed_groups(self.get_option('groups'), hostvars, hostname, strict=strict)
+        self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, hostname, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        if not HAS_JUMPSCALE:
+            raise AnsibleError("the jsgrid inventory plugin requires js-sdk")
+        self._read_config_data(path)
+
+        identity_name = self.get_option('identity_name')
+        identity = j.core.identity.find(identity_name) if identity_name else j.core.identity.me
+        try:
+            workloads = self._sync(identity)
+        except Exception as e:
+            raise AnsibleError(f"Failed to sync the jsgrid inventory: {e}")
+
+        box = identity_box(identity)
+        types = self.get_option('types')
+        hostname_tag = self.get_option('hostname_tag')
+        names = set()
+        for _, entry in sorted(workloads.items(), key=lambda item: int(item[0])):
+            if entry["next_action"] != "DEPLOY" or entry["type"] not in types:
+                continue
+            metadata = load_metadata(box, entry["metadata"])
+            hostname = str((metadata or {}).get(hostname_tag) or f"{entry['type']}-{entry['wid']}")
+            if hostname in names:
+                hostname = f"{hostname}-{entry['wid']}"
+            names.add(hostname)
+            self._add_workload(entry, metadata, hostname)
@@ -0,0 +1,86 @@
+DOCUMENTATION = r'''
+---
+name: free_ip
+short_description: allocate free ip addresses in a network from the controller
+version_added: "1.0.0"
+description:
+    - returns a free ip address of network_name on every node given as term, like the get_ip operation of the ip_management module.
+    - the network is loaded on every call since ansible runs the lookups of every host and task in a separate process.
+      the returned addresses are recorded in a locked file under JSGRID_STATE_DIR for reservation_ttl seconds, so the hosts
+      and the loop items of a play never get the same address before the workloads using them are deployed.
+options:
+    _terms:
+        description: ids of the nodes to get an address on
+        required: true
+    network_name:
+        description: name of the network
+        type: str
+        required: true
+    identity_name:
+        description: identity name to be used to load the network. defaults to j.core.identity.me
+        type: str
+    reservation_ttl:
+        description: seconds a returned address stays reserved
+        type: float
+        default: 600
+'''
+
+EXAMPLES = r'''
+- name: get an ip for a container
+  set_fact:
+    ip_address: "{{ lookup('threefold.jsgrid.free_ip', '26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY', network_name='web') }}"
+'''
+
+RETURN = r'''
+_raw:
+    description: one free ip address for every node.
+    type: list
+    elements: str
+'''
+
+import os
+import time
+
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.network import allocate_ips
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+    HAS_JUMPSCALE = True
+except ImportError:
+    HAS_JUMPSCALE = False
+
+
+class LookupModule(LookupBase):
+
+    def _network(self, identity_name, network_name):
+        network = get_zos(identity_name).network.load_network(network_name)
+        if network is None:
+            raise AnsibleError(f"The network {network_name} doesn't exist")
+        return network
+
+    def run(self, terms, variables=None, **kwargs):
+        if not HAS_JUMPSCALE:
+            raise AnsibleError("the free_ip lookup requires js-sdk")
+        self.set_options(var_options=variables, direct=kwargs)
+
+        identity_name = self.get_option('identity_name')
+        network_name = self.get_option('network_name')
+        network = self._network(identity_name, network_name)
+        state = SharedState(os.path.join(STATE_DIR, f"free-ip-{identity_name or 'default'}-{network_name}.json"))
+        now = time.time()
+        with state.locked() as reserved:
+            for ip_address, reserved_at in list(reserved.items()):
+                if now - reserved_at >= self.get_option('reservation_ttl'):
+                    del reserved[ip_address]
+                elif ip_address not in network.used_ips:
+                    network.used_ips.append(ip_address)
+            try:
+                ips = allocate_ips(network, terms)
+            except Exception as e:
+                raise AnsibleError(str(e))
+            for ip_address in ips:
+                reserved[ip_address] = now
+        return ips
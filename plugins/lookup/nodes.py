@@ -0,0 +1,170 @@
+DOCUMENTATION = r'''
+---
+name: nodes
+short_description: select nodes on the TF Grid from the controller
+version_added: "1.0.0"
+description:
+    - returns the ids of nodes matching the capacity and location filters, like the scheduler module, without running a module on the target.
+    - the explorer search results are kept for cache_ttl seconds in a locked file under JSGRID_STATE_DIR, since ansible runs
+      the lookups of every host and task in a separate process. the hosts and the tasks of a play making the same search
+      reuse them. nodes already part of network_name, with a deployed network resource, come first.
+options:
+    identity_name:
+        description: identity name to be used to search. defaults to j.core.identity.me
+        type: str
+    no_nodes:
+        description: how many nodes to select
+        type: int
+        default: 1
+    pool_id:
+        description: capacity pool id to search in
+        type: int
+    farm_id:
+        description: id of the farm to search in
+        type: int
+    farm_name:
+        description: name of the farm to search in
+        type: str
+    country:
+        description: country where the nodes are located
+        type: str
+    city:
+        description: city where the nodes are located
+        type: str
+    cru:
+        description: how much free cru on the node
+        type: int
+    mru:
+        description: how much free mru on the node
+        type: int
+    sru:
+        description: how much free sru on the node
+        type: int
+    hru:
+        description: how much free hru on the node
+        type: int
+    ip_version:
+        description: ip version available on the node
+        type: str
+        choices: [ipv4, ipv6]
+    public_ip:
+        description: select nodes that can be used to deploy public ip workloads
+        type: bool
+        default: false
+    excluded_nodes:
+        description: node ids to exclude
+        type: list
+        default: []
+    gateway:
+        description: select gateway nodes
+        type: bool
+        default: false
+    managed:
+        description: select gateway nodes with managed domains
+        type: bool
+        default: true
+    network_name:
+        description: prefer nodes that are already part of this network
+        type: str
+    randomize:
+        description: shuffle the nodes instead of using the explorer order
+        type: bool
+        default: true
+    cache_ttl:
+        description: seconds the search results are reused
+        type: float
+        default: 60
+'''
+
+EXAMPLES = r'''
+- name: deploy a container on every selected node
+  threefold.jsgrid.container:
+    pool_id: 149
+    network_name: web
+    node_id: "{{ item }}"
+    ip_address: "{{ lookup('threefold.jsgrid.free_ip', item, network_name='web') }}"
+    flist: https://hub.grid.tf/tf-official-apps/base:latest.flist
+  loop: "{{ query('threefold.jsgrid.nodes', no_nodes=3, cru=1, mru=1, sru=1, pool_id=149) }}"
+'''
+
+RETURN = r'''
+_raw:
+    description: ids of the selected nodes.
+    type: list
+    elements: str
+'''
+
+import json
+import os
+import random
+import time
+
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.network import is_node_deployed
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+    from ansible_collections.threefold.jsgrid.plugins.module_utils.scheduler import find_nodes
+    HAS_JUMPSCALE = True
+except ImportError:
+    HAS_JUMPSCALE = False
+
+
+FILTERS = [
+    "pool_id", "farm_id", "farm_name", "country", "city", "cru", "mru", "sru", "hru",
+    "ip_version", "public_ip", "gateway", "managed",
+]
+
+
+def _cached(state, key, ttl, fetch):
+    # the file stays locked while fetching, so the forks making the same search at the same time wait for the first one
+    now = time.time()
+    with state.locked() as cache:
+        for cached_key, (fetched_at, _) in list(cache.items()):
+            if now - fetched_at >= ttl:
+                del cache[cached_key]
+        if key not in cache:
+            cache[key] = [now, fetch()]
+        return cache[key][1]
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        if not HAS_JUMPSCALE:
+            raise AnsibleError("the nodes lookup requires js-sdk")
+        self.set_options(var_options=variables, direct=kwargs)
+
+        identity_name = self.get_option('identity_name')
+        ttl = self.get_option('cache_ttl')
+        filters = {key: self.get_option(key) for key in FILTERS}
+        zos = get_zos(identity_name)
+        state = SharedState(os.path.join(STATE_DIR, f"nodes-{identity_name or 'default'}.json"))
+        try:
+            key = json.dumps(["search", filters], sort_keys=True)
+            node_ids = _cached(state, key, ttl, lambda: [node.node_id for node in find_nodes(zos, **filters)])
+            network_name = self.get_option('network_name')
+            network_nodes = set()
+            if network_name:
+                def fetch_network_nodes():
+                    network = zos.network.load_network(network_name)
+                    if not network:
+                        return []
+                    return [nr.info.node_id for nr in network.network_resources if is_node_deployed(network, nr.info.node_id)]
+                network_nodes = set(_cached(state, json.dumps(["network", network_name]), ttl, fetch_network_nodes))
+        except Exception as e:
+            raise AnsibleError(f"Failed to search for nodes: {e}")
+
+        excluded = set(self.get_option('excluded_nodes'))
+        candidates = [node_id for node_id in node_ids if node_id not in excluded]
+        in_network = [node_id for node_id in candidates if node_id in network_nodes]
+        others = [node_id for node_id in candidates if node_id not in network_nodes]
+        if self.get_option('randomize'):
+            random.shuffle(in_network)
+            random.shuffle(others)
+        no_nodes = self.get_option('no_nodes')
+        if len(candidates) < no_nodes:
+            raise AnsibleError(f"Found {len(candidates)} nodes while {no_nodes} are required")
+        return (in_network + others)[:no_nodes]
@@ -0,0 +1,172 @@
+from jumpscale.loader import j
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.resolver import gateway_addresses
+
+
+def set_info(workload, description=None, metadata=None):
+    if metadata:
+        workload.info.metadata = metadata
+    if description:
+        workload.info.description = description
+    return workload
+
+
+def build_subdomain(zos, gateway_id, subdomain, addresses, pool_id, description=None, metadata=None):
+    workload = zos.gateway.sub_domain(gateway_id, subdomain, addresses, pool_id)
+    return set_info(workload, description, metadata)
+
+
+def build_proxy(zos, gateway_id, domain, trc_secret, pool_id, description=None, metadata=None):
+    workload = zos.gateway.tcp_proxy_reverse(gateway_id, domain, trc_secret, pool_id)
+    return set_info(workload, description, metadata)
+
+
+def build_4to6(zos, gateway_id, public_key, pool_id, description=None, metadata=None):
+    workload = zos.gateway.gateway_4to6(gateway_id, public_key, pool_id)
+    return set_info(workload, description, metadata)
+
+
+GATEWAY_TYPES = ["subdomain", "proxy", "4to6"]
+GATEWAY_REQUIRED_KEYS = {
+    "subdomain": ["subdomain"],
+    "proxy": ["domain", "trc_secret"],
+    "4to6": ["public_key"],
+}
+
+
+def build_gateway(zos, item, addresses_cache):
+    # item is a dict with a type from GATEWAY_TYPES and the options of the matching module
+    missing = [key for key in ["gateway", "pool"] + GATEWAY_REQUIRED_KEYS[item["type"]] if not item.get(key)]
+    if missing:
+        raise Exception(f"missing {', '.join(missing)}")
+    gateway_id = item["gateway"]
+    pool_id = item["pool"]
+    if item["type"] == "subdomain":
+        addresses = item.get("addresses")
+        if not addresses:
+            if gateway_id not in addresses_cache:
+                addresses_cache[gateway_id] = gateway_addresses(zos, gateway_id)
+            addresses = addresses_cache[gateway_id]
+        return build_subdomain(zos, gateway_id, item["subdomain"], addresses, pool_id, item.get("description"), item.get("metadata"))
+    if item["type"] == "proxy":
+        return build_proxy(zos, gateway_id, item["domain"], item["trc_secret"], pool_id, item.get("description"), item.get("metadata"))
+    return build_4to6(zos, gateway_id, item["public_key"], pool_id, item.get("description"), item.get("metadata"))
+
+
+def build_container(
+    zos,
+    node_id,
+    network_name,
+    ip_address,
+    flist,
+    pool_id,
+    env=None,
+    cpu=1,
+    memory=1024,
+    disk_size=256,
+    entrypoint="",
+    interactive=False,
+    secret_env=None,
+    public_ipv6=False,
+    storage_url="zdb://hub.grid.tf:9900",
+    volume_mounts=None,
+    log_channel=None,
+    description=None,
+    metadata=None,
+):
+    # secret_env values are encrypted for the node here. volume_mounts maps mount points to volume wids
+    # and log_channel is a dict with type, host, port and name
+    encrypted_env = {}
+    for key, val in (secret_env or {}).items():
+        encrypted_env[key] = zos.container.encrypt_secret(node_id, str(val))
+    workload = zos.container.create(
+        node_id=node_id,
+        network_name=network_name,
+        ip_address=ip_address,
+        flist=flist,
+        capacity_pool_id=pool_id,
+        env=env or {},
+        cpu=cpu,
+        memory=memory,
+        disk_size=disk_size,
+        entrypoint=entrypoint,
+        interactive=interactive,
+        secret_env=encrypted_env,
+        public_ipv6=public_ipv6,
+        storage_url=storage_url,
+    )
+    if log_channel:
+        zos.container.add_logs(
+            container=workload,
+            channel_type=log_channel["type"],
+            channel_host=log_channel["host"],
+            channel_port=log_channel["port"],
+            channel_name=log_channel["name"],
+        )
+    for mount_point, vol_id in (volume_mounts or {}).items():
+        zos.volume.attach_existing(workload, f"{vol_id}-1", mount_point)
+    return set_info(workload, description, metadata)
+
+
+def build_volume(zos, node_id, pool_id, size, type="SSD", description=None, metadata=None):
+    workload = zos.volume.create(node_id=node_id, pool_id=pool_id, size=size, type=type.upper())
+    return set_info(workload, description, metadata)
+
+
+def build_zdb(zos, node_id, size, mode, password, pool_id, disk_type="SSD", description=None, metadata=None):
+    workload = zos.zdb.create(node_id, size, mode, password, pool_id, disk_type)
+    return set_info(workload, description, metadata)
+
+
+def build_public_ip(zos, node_id, pool_id, ip_address, description=None, metadata=None):
+    workload = zos.public_ip.create(node_id=node_id, pool_id=pool_id, ipaddress=ip_address)
+    return set_info(workload, description, metadata)
+
+
+def read_ssh_keys(paths):
+    ssh_keys = []
+    for key in paths:
+        key_path = j.sals.fs.expanduser(key)
+        ssh_keys.append(j.sals.fs.read_file(key_path).strip())
+    return ssh_keys
+
+
+def build_kubernetes(
+    zos,
+    node_id,
+    network_name,
+    cluster_secret,
+    ip_address,
+    size,
+    ssh_keys,
+    pool_id,
+    public_ip_wid=0,
+    master_ip=None,
+    description=None,
+    metadata=None,
+):
+    # a worker is built when the master ip is given
+    if not master_ip:
+        workload = zos.kubernetes.add_master(
+            node_id=node_id,
+            network_name=network_name,
+            cluster_secret=cluster_secret,
+            ip_address=ip_address,
+            size=size,
+            ssh_keys=ssh_keys,
+            pool_id=pool_id,
+            public_ip_wid=public_ip_wid,
+        )
+    else:
+        workload = zos.kubernetes.add_worker(
+            node_id=node_id,
+            network_name=network_name,
+            cluster_secret=cluster_secret,
+            ip_address=ip_address,
+            size=size,
+            master_ip=master_ip,
+            ssh_keys=ssh_keys,
+            pool_id=pool_id,
+            public_ip_wid=public_ip_wid,
+        )
+    return set_info(workload, description, metadata)
@@ -0,0 +1,98 @@
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+
+
+CATALOG_TTL = float(os.environ.get("JSGRID_CATALOG_TTL", 300))
+# above this number of missing items, listing the whole catalog is cheaper than fetching them one by one
+LIST_THRESHOLD = 10
+
+CATALOGS = {
+    "nodes": dict(
+        list=lambda explorer: explorer.nodes.list(),
+        get=lambda explorer, key: explorer.nodes.get(key),
+        key="node_id",
+    ),
+    "gateways": dict(
+        list=lambda explorer: explorer.gateway.list(),
+        get=lambda explorer, key: explorer.gateway.get(key),
+        key="node_id",
+    ),
+    "farms": dict(
+        list=lambda explorer: explorer.farms.list(),
+        get=lambda explorer, key: explorer.farms.get(farm_id=int(key)),
+        key="id",
+    ),
+}
+
+
+def _catalog_state(explorer, kind):
+    host = urlparse(explorer.url).netloc.replace(":", "_")
+    return SharedState(os.path.join(STATE_DIR, f"catalog-{host}-{kind}.json"))
+
+
+def get_catalog(explorer, kind, ttl=CATALOG_TTL, refresh=False):
+    # returns a mapping from key to the dict of every item, shared by all the tasks on this machine
+    state = _catalog_state(explorer, kind)
+    now = time.time()
+    if not refresh:
+        with state.locked() as data:
+            if data and now - data["fetched_at"] < ttl:
+                return data["items"]
+    catalog = CATALOGS[kind]
+    items = {str(getattr(item, catalog["key"])): item.to_dict() for item in catalog["list"](explorer)}
+    # values json can't store (e.g. dates) are kept as strings, so the cached catalog is the same as the fetched one
+    items = json.loads(json.dumps(items, default=str))
+    with state.locked() as data:
+        data.clear()
+        data.update(fetched_at=now, items=items)
+    return items
+
+
+def cached_catalog(explorer, kind, ttl=CATALOG_TTL):
+    with _catalog_state(explorer, kind).locked() as data:
+        if data and time.time() - data["fetched_at"] < ttl:
+            return data["items"]
+    return None
+
+
+def get_items(explorer, kind, keys, use_cache=True, ttl=CATALOG_TTL):
+    # returns a mapping from key to (item dict, error)
+    keys = [str(key) for key in keys]
+    found = {}
+    if use_cache:
+        items = cached_catalog(explorer, kind, ttl)
+        if items is None and len(keys) > LIST_THRESHOLD:
+            items = get_catalog(explorer, kind, ttl, refresh=True)
+        for key in keys:
+            if items and key in items:
+                found[key] = (items[key], None)
+    missing = [key for key in keys if key not in found]
+    get_item = CATALOGS[kind]["get"]
+    results = run_concurrently(lambda key: get_item(explorer, key).to_dict(), missing)
+    found.update(zip(missing, results))
+    return found
+
+
+def project(data, fields):
+    # keeps only the dotted paths in fields, e.g. ["node_id", "location.country"]
+    if not fields:
+        return data
+    projected = {}
+    for field in fields:
+        value = data
+        keys = field.split(".")
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return projected
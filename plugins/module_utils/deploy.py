@@ -0,0 +1,72 @@
+from time import time
+
+import gevent
+from gevent.pool import Pool
+from jumpscale.clients.explorer.models import NextAction
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import TIMER
+
+
+DEFAULT_CONCURRENCY = 10
+
+
+def run_concurrently(func, items, concurrency=DEFAULT_CONCURRENCY):
+    # returns a (result, error) pair for every item in the same order as the items
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    items = list(items)
+    if not items:
+        return []
+    pool = Pool(max(1, min(concurrency, len(items))))
+    return pool.map(call, items)
+
+
+def raise_first_error(results):
+    for _, error in results:
+        if error is not None:
+            raise error
+    return [result for result, _ in results]
+
+
+def deploy_workloads(zos, workloads, concurrency=DEFAULT_CONCURRENCY, wait=True):
+    # deploys the workloads with bounded parallelism then waits for all of them together.
+    # returns dict(wid, success, message) for every workload in the same order
+    outcomes = []
+    for wid, error in run_concurrently(zos.workloads.deploy, workloads, concurrency):
+        if error is None:
+            outcomes.append(dict(wid=wid, success=True, message=""))
+        else:
+            outcomes.append(dict(wid=None, success=False, message=str(error)))
+    if wait:
+        deployed = [outcome for outcome in outcomes if outcome["wid"]]
+        waited = run_concurrently(lambda outcome: zos.workloads.wait(outcome["wid"]), deployed, len(deployed))
+        for outcome, (state, error) in zip(deployed, waited):
+            if error is None:
+                outcome["success"], outcome["message"] = state
+            else:
+                outcome.update(success=False, message=str(error))
+    return outcomes
+
+
+def wait_until_decommissioned(zos, wid, expiration=3, deleted=False):
+    # next_action is DELETE as soon as the decommission is accepted, it's DELETED once the node removed the workload.
+    # wait for deleted when the resources of the workload (ip, volumes) are reused right after
+    start = time()
+    done = [NextAction.DELETED] if deleted else [NextAction.DELETED, NextAction.DELETE]
+
+    with TIMER.phase("wait"):
+        while time() - start < expiration * 60:
+            workload = zos.workloads.get(wid)
+            if workload.info.next_action in done:
+                return True
+            gevent.sleep(1)
+    raise TimeoutError(f"Failed to decmmission wid {wid}")
+
+
+def decommission_workloads(zos, wids, concurrency=DEFAULT_CONCURRENCY, deleted=False):
+    raise_first_error(run_concurrently(zos.workloads.decomission, wids, concurrency))
+    raise_first_error(run_concurrently(lambda wid: wait_until_decommissioned(zos, wid, deleted=deleted), wids, concurrency))
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from jumpscale.loader import j
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import get_limiter
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import TIMER, instrument_zos
+
+
+POOL_SIZE = int(os.environ.get("JSGRID_HTTP_POOL_SIZE", 20))
+MAX_HOST_REQUESTS = int(os.environ.get("JSGRID_HTTP_MAX_HOST_REQUESTS", 10))
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def _host_semaphore(host):
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_HOST_REQUESTS)
+        return _host_semaphores[host]
+
+
+def is_server_failure(response):
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+def configure_session(session):
+    # sessions are configured in place, so every client sharing the session object
+    # (the explorer sub clients, the sals) gets the pooled transport. the semaphores
+    # are per process and shared by every session talking to the same host.
+    if getattr(session, "_jsgrid_transport", False):
+        return session
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    send_request = session.request
+
+    def request(method, url, *args, **kwargs):
+        host = urlparse(url).netloc
+        limiter = get_limiter(host)
+        start = time.time()
+        limiter.acquire()
+        throttled = time.time() - start
+        try:
+            with _host_semaphore(host):
+                try:
+                    response = send_request(method, url, *args, **kwargs)
+                except HTTPError as e:
+                    limiter.record(not is_server_failure(e.response))
+                    raise
+                except (ConnectionError, Timeout):
+                    limiter.record(False)
+                    raise
+        finally:
+            TIMER.explorer_request(method, url, start, time.time() - start, throttled)
+        limiter.record(not is_server_failure(response))
+        return response
+
+    session.request = request
+    session._jsgrid_transport = True
+    return session
+
+
+def configure_explorer(explorer):
+    session = getattr(explorer, "_session", None)
+    if session is not None:
+        configure_session(session)
+    return explorer
+
+
+def get_zos(identity_name=None):
+    with TIMER.phase("identity"):
+        zos = j.sals.zos.get(identity_name)
+    configure_explorer(zos._explorer)
+    return instrument_zos(zos)
+
+
+def get_explorer(identity_name=None):
+    with TIMER.phase("identity"):
+        identity = j.core.identity.find(identity_name) if identity_name else j.core.identity.me
+        explorer = identity.explorer
+    return configure_explorer(explorer)
@@ -0,0 +1,31 @@
+import base64
+
+from jumpscale.loader import j
+from nacl.public import Box
+
+
+def identity_box(identity):
+    # metadata is encrypted by the identity for itself
+    pk = identity.nacl.signing_key.verify_key.to_curve25519_public_key()
+    sk = identity.nacl.signing_key.to_curve25519_private_key()
+    return Box(sk, pk)
+
+
+def encrypt_metadata(box, metadata):
+    data = j.data.serializers.json.dumps(metadata)
+    return base64.b85encode(box.encrypt(data.encode())).decode()
+
+
+def decrypt_metadata(box, encrypted_metadata):
+    return box.decrypt(base64.b85decode(encrypted_metadata.encode())).decode()
+
+
+def load_metadata(box, encrypted_metadata):
+    # returns the decrypted metadata dict, or None when the metadata isn't encrypted json by this identity
+    if not encrypted_metadata:
+        return None
+    try:
+        metadata = j.data.serializers.json.loads(decrypt_metadata(box, encrypted_metadata))
+    except Exception:
+        return None
+    return metadata if isinstance(metadata, dict) else None
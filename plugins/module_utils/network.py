@@ -0,0 +1,268 @@
+import copy
+import hashlib
+from time import time
+
+import gevent
+import netaddr
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently, raise_first_error
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import TIMER
+
+
+TOPOLOGIES = ["mesh", "hub"]
+WG_ROUTING_RANGE = "100.64.0.0/16"
+
+
+def wg_routing_ip(ip_range):
+    words = netaddr.IPNetwork(str(ip_range)).ip.words
+    return f"100.64.{words[1]}.{words[2]}/32"
+
+
+def resource_signature(network_resource):
+    peers = []
+    for peer in network_resource.peers:
+        allowed = tuple(sorted(str(ip_range) for ip_range in peer.allowed_iprange))
+        peers.append((peer.public_key, peer.endpoint or "", str(peer.iprange), allowed))
+    return tuple(sorted(peers))
+
+
+def network_signatures(network):
+    return {nr.info.node_id: resource_signature(nr) for nr in network.network_resources}
+
+
+def changed_node_ids(network, old_signatures):
+    node_ids = []
+    for nr in network.network_resources:
+        if old_signatures.get(nr.info.node_id) != resource_signature(nr):
+            node_ids.append(nr.info.node_id)
+    return node_ids
+
+
+def _peer_templates(network):
+    # every network resource shows up as a peer of at least one other resource after the
+    # mesh is generated. keep one copy per public key, preferring the ones with an endpoint
+    templates = {}
+    for nr in network.network_resources:
+        for peer in nr.peers:
+            current = templates.get(peer.public_key)
+            if current is None or (not current.endpoint and peer.endpoint):
+                templates[peer.public_key] = peer
+    return templates
+
+
+def _external_peers(network_resource, node_keys):
+    return [peer for peer in network_resource.peers if peer.public_key not in node_keys]
+
+
+def select_hubs(network, hubs=None, hub_count=2):
+    resources = {nr.info.node_id: nr for nr in network.network_resources}
+    if hubs:
+        missing = [node_id for node_id in hubs if node_id not in resources]
+        if missing:
+            raise Exception(f"Hub nodes {missing} are not part of the network {network.name}")
+        return sorted(hubs)
+    node_keys = {nr.wireguard_public_key for nr in resources.values()}
+    access_nodes = [node_id for node_id, nr in resources.items() if _external_peers(nr, node_keys)]
+    if access_nodes:
+        return sorted(access_nodes)
+    templates = _peer_templates(network)
+    public_nodes = []
+    for node_id, nr in resources.items():
+        template = templates.get(nr.wireguard_public_key)
+        if template is not None and template.endpoint:
+            public_nodes.append(node_id)
+    if not public_nodes:
+        raise Exception(f"Network {network.name} has no public node that can be used as a hub")
+    return sorted(public_nodes)[:hub_count]
+
+
+def _primary_hub(node_id, hubs):
+    digest = hashlib.md5(node_id.encode()).hexdigest()
+    return hubs[int(digest, 16) % len(hubs)]
+
+
+def apply_hub_topology(network, hubs):
+    # rewrites the peers generated by the sdk so that hubs peer with every node while the other
+    # nodes only peer with the hubs and route the rest of the network through one of them.
+    # adding a node then only changes the peers of the hubs and of the new node.
+    templates = _peer_templates(network)
+    resources = network.network_resources
+    node_keys = {nr.wireguard_public_key for nr in resources}
+    for nr in resources:
+        if nr.info.node_id not in hubs:
+            continue
+        template = templates.get(nr.wireguard_public_key)
+        if template is None or not template.endpoint:
+            raise Exception(f"Hub node {nr.info.node_id} doesn't have a public endpoint")
+
+    routes = {}
+    for nr in resources:
+        allowed = [str(nr.iprange), wg_routing_ip(nr.iprange)]
+        for peer in _external_peers(nr, node_keys):
+            allowed += [str(ip_range) for ip_range in peer.allowed_iprange]
+        routes[nr.info.node_id] = allowed
+
+    for nr in resources:
+        is_hub = nr.info.node_id in hubs
+        primary = None if is_hub else _primary_hub(nr.info.node_id, hubs)
+        # peers which aren't network resources are access clients and are left untouched
+        peers = _external_peers(nr, node_keys)
+        for other in resources:
+            if other is nr or (not is_hub and other.info.node_id not in hubs):
+                continue
+            template = templates.get(other.wireguard_public_key)
+            if template is None:
+                raise Exception(f"No wireguard peer information found for node {other.info.node_id}")
+            peer = copy.deepcopy(template)
+            if other.info.node_id == primary:
+                peer.allowed_iprange = [str(network.iprange), WG_ROUTING_RANGE]
+            else:
+                peer.allowed_iprange = list(routes[other.info.node_id])
+            peers.append(peer)
+        nr.peers = sorted(peers, key=lambda peer: peer.public_key)
+
+
+def apply_topology(network, topology, hubs):
+    if topology == "hub":
+        apply_hub_topology(network, select_hubs(network, hubs))
+
+
+def detect_topology(network):
+    # returns the topology and the hubs of the network as deployed. hubs peer with every other node, so the network
+    # is a hub network when some node doesn't. a hub network where every node still peers with all the others
+    # (e.g. two nodes) can't be told apart from a mesh
+    resources = network.network_resources
+    node_keys = {nr.wireguard_public_key for nr in resources}
+    full = [
+        nr.info.node_id for nr in resources
+        if len([peer for peer in nr.peers if peer.public_key in node_keys]) >= len(resources) - 1
+    ]
+    if len(full) == len(resources):
+        return "mesh", None
+    return "hub", sorted(full)
+
+
+def resolve_topology(network, topology=None, hubs=None):
+    # keeps the current topology of the network when none is given, so changing a hub network doesn't re-mesh it
+    if topology is not None:
+        return topology, hubs
+    topology, current_hubs = detect_topology(network)
+    return topology, hubs or current_hubs
+
+
+def normalize_nodes(nodes):
+    # nodes can be a comma separated string or a list of node ids, or a mapping from node ids to ip ranges
+    if isinstance(nodes, str):
+        nodes = [node_id.strip() for node_id in nodes.split(",") if node_id.strip()]
+    if isinstance(nodes, list):
+        return {node_id: None for node_id in nodes}
+    if isinstance(nodes, dict):
+        return {node_id: ip_range or None for node_id, ip_range in nodes.items()}
+    raise Exception("nodes must be a mapping from node ids to ip ranges or a list of node ids")
+
+
+def is_node_in_network(network, node_id):
+    return network.get_node_range(node_id) is not None
+
+
+def is_node_deployed(network, node_id):
+    # the node is in the network and its network resource was deployed successfully. a node whose resource failed
+    # keeps its range but can't be used until the resource is deployed again
+    for network_resource in network.network_resources:
+        if network_resource.info.node_id == node_id:
+            result = network_resource.info.result
+            return bool(result.workload_id) and result.state.value == 1
+    return False
+
+
+def get_network_range(subnet):
+    network = netaddr.IPNetwork(subnet)
+    return str(network.supernet(16)[0])
+
+
+def wait_until_deployed(zos, wid, expiration=3):
+    start = time()
+
+    with TIMER.phase("wait"):
+        while time() - start < expiration * 60:
+            workload = zos.workloads.get(wid)
+            if workload.info.result.workload_id:
+                success = workload.info.result.state.value == 1
+                if success:
+                    return True
+                else:
+                    error_message = workload.info.result.message
+                    raise Exception(f"Failed to add node with workload id {wid} to the network due to the error: {error_message}")
+            gevent.sleep(1)
+    raise TimeoutError(f"Failed to add the node to the network in time. Workload id is {wid}")
+
+
+def update_network(zos, network, node_ids, deploy_node_ids=None):
+    # only the resources in deploy_node_ids are redeployed when specified
+    resources = []
+    for network_resource in network.network_resources:
+        if deploy_node_ids is not None and network_resource.info.node_id not in deploy_node_ids:
+            continue
+        resources.append(network_resource)
+    wids = raise_first_error(run_concurrently(zos.workloads.deploy, resources))
+
+    def wait(resource_wid):
+        network_resource, wid = resource_wid
+        timeout = 3 if network_resource.info.node_id in node_ids else 1
+        return wait_until_deployed(zos, wid, timeout)
+
+    results = run_concurrently(wait, list(zip(resources, wids)))
+    for network_resource, (_, error) in zip(resources, results):
+        if error is None:
+            continue
+        if isinstance(error, TimeoutError) and network_resource.info.node_id not in node_ids:
+            continue
+        raise error
+
+
+def add_nodes(zos, network_name, nodes, pool_id, topology=None, hubs=None, network_range=None):
+    # adds all the nodes ({node_id: ip_range or None}) in a single network update.
+    # returns the loaded network and whether it was changed
+    changed = False
+    network = zos.network.load_network(network_name)
+    if network is None:
+        given_ranges = [ip_range for ip_range in nodes.values() if ip_range]
+        if not network_range and not given_ranges:
+            raise Exception(f"The network {network_name} doesn't exist. ip_range or a node range is required to create it")
+        network = zos.network.create(network_range or get_network_range(given_ranges[0]), network_name)
+    topology, hubs = resolve_topology(network, topology, hubs)
+    old_signatures = network_signatures(network)
+    allocated = [ip_range for ip_range in nodes.values() if ip_range]
+    failed = []
+    for node_id, ip_range in nodes.items():
+        if is_node_in_network(network, node_id):
+            if not is_node_deployed(network, node_id):
+                changed = True
+                failed.append(node_id)
+            continue
+        if not ip_range:
+            ip_range = network.get_free_range(*allocated)
+            if not ip_range:
+                raise Exception(f"No available ip subnets in network {network_name} for node {node_id}")
+            allocated.append(ip_range)
+        changed = True
+        zos.network.add_node(network, node_id, ip_range, pool_id)
+    if changed:
+        apply_topology(network, topology, hubs)
+        # the resources of the nodes that failed before are deployed again even if their peers didn't change
+        deploy_node_ids = set(changed_node_ids(network, old_signatures)) | set(failed)
+        update_network(zos, network, list(nodes.keys()), deploy_node_ids)
+    return network, changed
+
+
+def allocate_ips(network, node_ids):
+    # picks a free ip on every node, a node listed twice gets two different ips
+    ips = []
+    for node_id in node_ids:
+        ip_address = network.get_free_ip(node_id)
+        if not ip_address:
+            raise Exception(f"No free ip available on node {node_id} in network {network.name}")
+        if ip_address not in network.used_ips:
+            network.used_ips.append(ip_address)
+        ips.append(ip_address)
+    return ips
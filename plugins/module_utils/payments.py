@@ -0,0 +1,40 @@
+import gevent
+from jumpscale.loader import j
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently
+
+
+MIN_INTERVAL = 0.5
+MAX_INTERVAL = 5
+BACKOFF = 1.5
+
+
+def is_settled(payment):
+    return payment.paid and any([payment.released, payment.canceled])
+
+
+def is_expired(payment):
+    return payment.expiration.timestamp() <= j.data.time.utcnow().timestamp
+
+
+def wait_for_payment(zos, reservation_id, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    # payout_farmers only returns once the stellar transaction is in a ledger, so settlement on
+    # the explorer side is imminent at this point: poll quickly first then back off
+    interval = min_interval
+    payment = zos.pools.get_payment_info(reservation_id)
+    while not is_settled(payment) and not is_expired(payment):
+        gevent.sleep(interval)
+        interval = min(interval * BACKOFF, max_interval)
+        payment = zos.pools.get_payment_info(reservation_id)
+    return payment
+
+
+def wait_for_payments(zos, reservation_ids, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    # returns a mapping from reservation id to (payment, error)
+    reservation_ids = list(reservation_ids)
+    results = run_concurrently(
+        lambda reservation_id: wait_for_payment(zos, reservation_id, min_interval, max_interval),
+        reservation_ids,
+        concurrency=len(reservation_ids) or 1,
+    )
+    return dict(zip(reservation_ids, results))
@@ -0,0 +1,96 @@
+import math
+
+from jumpscale.loader import j
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently
+from ansible_collections.threefold.jsgrid.plugins.module_utils.payments import wait_for_payments
+from ansible_collections.threefold.jsgrid.plugins.module_utils.stellar import wallet_lock
+
+
+def reserve_pool(zos, pool):
+    if pool.get("pool_id"):
+        return zos.pools.extend(
+            pool_id=pool["pool_id"],
+            cu=pool.get("cus", 0),
+            su=pool.get("sus", 0),
+            ipv4us=pool.get("ipv4us", 0),
+            node_ids=pool.get("node_ids"),
+        )
+    return zos.pools.create(
+        cu=pool.get("cus", 0),
+        su=pool.get("sus", 0),
+        ipv4us=pool.get("ipv4us", 0),
+        farm=pool.get("farm_name"),
+    )
+
+
+def needs_payment(pool):
+    return any([pool.get("cus"), pool.get("sus"), pool.get("ipv4us")])
+
+
+def manage_pools(zos, wallet, wallet_name, pools, wait):
+    outcomes = []
+    reservations = run_concurrently(lambda pool: reserve_pool(zos, pool), pools)
+    with wallet_lock(wallet_name):
+        # payments are matched by the transaction memo, so every reservation needs its own transaction
+        for pool, (pool_info, error) in zip(pools, reservations):
+            outcome = dict(pool_id=pool.get("pool_id"), reservation_id=None, paid=False, error="", message={})
+            if error is None:
+                outcome.update(reservation_id=pool_info.reservation_id, message=pool_info.to_dict())
+                outcome["pool_id"] = outcome["pool_id"] or pool_info.reservation_id
+                try:
+                    zos.billing.payout_farmers(wallet, pool_info)
+                    outcome["paid"] = True
+                except Exception as e:
+                    outcome["error"] = f"payment failed: {e}"
+            else:
+                outcome["error"] = f"reservation failed: {error}"
+            outcomes.append(outcome)
+
+    if wait:
+        awaited = [
+            outcome["reservation_id"] for pool, outcome in zip(pools, outcomes) if outcome["paid"] and needs_payment(pool)
+        ]
+        payments = wait_for_payments(zos, awaited)
+        for outcome in outcomes:
+            if outcome["reservation_id"] not in payments:
+                continue
+            payment, error = payments[outcome["reservation_id"]]
+            if error is not None:
+                outcome.update(paid=False, error=f"failed to get payment info: {error}")
+            elif not all([payment.paid, payment.released]):
+                outcome.update(paid=False, error=payment.cause or "payment expired")
+    return outcomes
+
+
+RESOURCES = [("cus", "active_cu"), ("sus", "active_su"), ("ipv4us", "active_ipv4")]
+
+
+def _timestamp(value):
+    if hasattr(value, "timestamp"):
+        value = value.timestamp() if callable(value.timestamp) else value.timestamp
+    return float(value or 0)
+
+
+def forecast_pools(pools, runway, now=None):
+    # pool units are consumed every second by the active capacity (active_cu, active_su, active_ipv4).
+    # every resource is computed as a column over all the pools at once. runway is in seconds
+    now = now or j.data.time.utcnow().timestamp
+    pools = list(pools)
+    forecasts = [dict(pool_id=pool.pool_id, expires_in=None, expires_at=None, extend={}) for pool in pools]
+    elapsed = [max(now - _timestamp(pool.last_updated), 0) for pool in pools]
+    for units_field, active_field in RESOURCES:
+        active = [float(getattr(pool, active_field, 0) or 0) for pool in pools]
+        units = [float(getattr(pool, units_field, 0) or 0) for pool in pools]
+        remaining = [max(total - rate * spent, 0) for total, rate, spent in zip(units, active, elapsed)]
+        lifetime = [left / rate if rate else None for left, rate in zip(remaining, active)]
+        missing = [max(math.ceil(rate * runway - left), 0) for left, rate in zip(remaining, active)]
+        for forecast, left, life, extra in zip(forecasts, remaining, lifetime, missing):
+            forecast[f"remaining_{units_field}"] = left
+            forecast["extend"][units_field] = extra
+            if life is not None and (forecast["expires_in"] is None or life < forecast["expires_in"]):
+                forecast["expires_in"] = life
+    for forecast in forecasts:
+        if forecast["expires_in"] is not None:
+            forecast["expires_at"] = now + forecast["expires_in"]
+    return forecasts
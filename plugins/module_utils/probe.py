@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+
+
+PROBE_TTL = float(os.environ.get("JSGRID_PROBE_TTL", 300))
+# a gateway that didn't answer is probed again sooner, so a transient failure doesn't keep it last for the whole ttl
+PROBE_FAILURE_TTL = float(os.environ.get("JSGRID_PROBE_FAILURE_TTL", 30))
+PROBE_TIMEOUT = 2
+PROBE_TOTAL_TIMEOUT = 5
+
+
+async def _connect_rtt(host, port, timeout):
+    start = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = time.monotonic() - start
+    writer.close()
+    return rtt
+
+
+async def _probe_gateway(gateway, timeout):
+    rtts = await asyncio.gather(*[_connect_rtt(host, gateway.tcp_router_port, timeout) for host in gateway.dns_nameserver])
+    rtts = [rtt for rtt in rtts if rtt is not None]
+    return min(rtts) if rtts else None
+
+
+async def _probe_all(gateways, timeout, total_timeout):
+    tasks = {asyncio.ensure_future(_probe_gateway(gateway, timeout)): gateway.node_id for gateway in gateways}
+    done, pending = await asyncio.wait(list(tasks), timeout=total_timeout)
+    for task in pending:
+        task.cancel()
+    # gateways which didn't answer before the global timeout are unreachable
+    latencies = {node_id: None for node_id in tasks.values()}
+    latencies.update({tasks[task]: task.result() for task in done})
+    return latencies
+
+
+def probe_gateways(gateways, timeout=PROBE_TIMEOUT, total_timeout=PROBE_TOTAL_TIMEOUT, ttl=PROBE_TTL, failure_ttl=PROBE_FAILURE_TTL):
+    # returns a mapping from gateway node id to the tcp connect round trip time in seconds (None if unreachable).
+    # the latency is measured to the tcp router port of every nameserver of the gateway and cached for ttl seconds,
+    # failures for failure_ttl seconds
+    gateways = list(gateways)
+    cache = SharedState(os.path.join(STATE_DIR, "gateway-latency.json"))
+    now = time.time()
+    latencies = {}
+    with cache.locked() as state:
+        for gateway in gateways:
+            entry = state.get(gateway.node_id)
+            if entry and now - entry["probed_at"] < (ttl if entry["rtt"] is not None else failure_ttl):
+                latencies[gateway.node_id] = entry["rtt"]
+    missing = [gateway for gateway in gateways if gateway.node_id not in latencies]
+    if missing:
+        loop = asyncio.new_event_loop()
+        try:
+            probed = loop.run_until_complete(_probe_all(missing, timeout, total_timeout))
+        finally:
+            loop.close()
+        latencies.update(probed)
+        with cache.locked() as state:
+            for node_id, rtt in probed.items():
+                state[node_id] = {"rtt": rtt, "probed_at": now}
+    return latencies
+
+
+def rank_by_latency(gateways, latencies):
+    # reachable gateways first, fastest first
+    return sorted(gateways, key=lambda gateway: (latencies.get(gateway.node_id) is None, latencies.get(gateway.node_id) or 0))
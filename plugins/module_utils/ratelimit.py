@@ -0,0 +1,142 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+STATE_DIR = os.environ.get("JSGRID_STATE_DIR", os.path.join(os.path.expanduser("~"), ".ansible", "jsgrid"))
+RATE = float(os.environ.get("JSGRID_EXPLORER_RATE", 10))
+BURST = float(os.environ.get("JSGRID_EXPLORER_BURST", 20))
+BREAKER_THRESHOLD = int(os.environ.get("JSGRID_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("JSGRID_BREAKER_COOLDOWN", 30))
+
+# throttling done by this process, the totals of all the processes are kept in the state file
+STATS = {"requests": 0, "throttled": 0, "throttle_time": 0.0, "rejected": 0}
+
+
+class ExplorerUnavailable(Exception):
+    pass
+
+
+class SharedState:
+    # json state shared by all the forks on this machine, guarded by an exclusive lock on a separate lock file.
+    # the new state is serialized before anything is written and replaces the file in one rename,
+    # so a failing update leaves the previous state intact
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def locked(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path) as f:
+                        content = f.read()
+                except FileNotFoundError:
+                    content = ""
+                try:
+                    state = json.loads(content) if content else {}
+                except ValueError:
+                    state = {}
+                try:
+                    yield state
+                finally:
+                    self._write(json.dumps(state), content)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write(self, data, previous):
+        if data == previous:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=f".{os.path.basename(self.path)}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class ExplorerLimiter:
+    def __init__(self, host, rate=RATE, burst=BURST, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = SharedState(os.path.join(STATE_DIR, f"explorer-{host.replace(':', '_')}.json"))
+
+    def _check_breaker(self, state, now):
+        breaker = state.setdefault("breaker", {"failures": 0, "opened_at": 0})
+        if breaker["failures"] < self.threshold:
+            return
+        remaining = breaker["opened_at"] + self.cooldown - now
+        if remaining > 0:
+            STATS["rejected"] += 1
+            state.setdefault("metrics", {}).setdefault("rejected", 0)
+            state["metrics"]["rejected"] += 1
+            raise ExplorerUnavailable(
+                f"Explorer {self.host} is degraded after {breaker['failures']} consecutive failures. "
+                f"Requests are rejected for the next {remaining:.0f} seconds"
+            )
+        # cooldown passed, let requests through until the next failure reopens the breaker
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.state.locked() as state:
+                now = time.time()
+                self._check_breaker(state, now)
+                metrics = state.setdefault("metrics", {"requests": 0, "throttle_time": 0.0})
+                if self.rate <= 0:
+                    wait = 0
+                else:
+                    bucket = state.setdefault("bucket", {"tokens": self.burst, "updated": now})
+                    elapsed = max(now - bucket["updated"], 0)
+                    bucket["tokens"] = min(self.burst, bucket["tokens"] + elapsed * self.rate)
+                    bucket["updated"] = now
+                    if bucket["tokens"] >= 1:
+                        bucket["tokens"] -= 1
+                        wait = 0
+                    else:
+                        wait = (1 - bucket["tokens"]) / self.rate
+                if not wait:
+                    metrics["requests"] = metrics.get("requests", 0) + 1
+                    metrics["throttle_time"] = metrics.get("throttle_time", 0.0) + waited
+                    break
+            time.sleep(wait)
+            waited += wait
+        STATS["requests"] += 1
+        if waited:
+            STATS["throttled"] += 1
+            STATS["throttle_time"] += waited
+        return waited
+
+    def record(self, success):
+        with self.state.locked() as state:
+            breaker = state.setdefault("breaker", {"failures": 0, "opened_at": 0})
+            if success:
+                breaker["failures"] = 0
+                return
+            breaker["failures"] += 1
+            if breaker["failures"] >= self.threshold:
+                breaker["opened_at"] = time.time()
+
+    def metrics(self):
+        with self.state.locked() as state:
+            return dict(state.get("metrics", {}))
+
+
+_limiters = {}
+
+
+def get_limiter(host):
+    if host not in _limiters:
+        _limiters[host] = ExplorerLimiter(host)
+    return _limiters[host]
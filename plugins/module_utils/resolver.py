@@ -0,0 +1,44 @@
+import os
+import time
+
+from jumpscale.loader import j
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.catalog import get_items
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+
+
+DNS_TTL = float(os.environ.get("JSGRID_DNS_TTL", 300))
+
+
+def resolve_hosts(hosts, ttl=DNS_TTL):
+    # resolves the hosts concurrently. addresses resolved less than ttl seconds ago on this machine are reused
+    # returns a mapping from host to (address, error) in the order of the hosts
+    hosts = list(dict.fromkeys(hosts))
+    cache = SharedState(os.path.join(STATE_DIR, "dns.json"))
+    now = time.time()
+    addresses = {}
+    with cache.locked() as state:
+        for host in hosts:
+            entry = state.get(host)
+            if entry and now - entry["resolved_at"] < ttl:
+                addresses[host] = (entry["address"], None)
+    missing = [host for host in hosts if host not in addresses]
+    resolved = run_concurrently(j.sals.nettools.get_host_by_name, missing, len(missing))
+    addresses.update(zip(missing, resolved))
+    with cache.locked() as state:
+        for host, (address, error) in zip(missing, resolved):
+            if error is None:
+                state[host] = {"address": address, "resolved_at": now}
+    return {host: addresses[host] for host in hosts}
+
+
+def gateway_addresses(zos, gateway_id):
+    gateway, error = get_items(zos._explorer, "gateways", [gateway_id])[gateway_id]
+    if error is not None:
+        raise error
+    resolved = resolve_hosts(gateway["dns_nameserver"])
+    errors = [str(error) for _, error in resolved.values() if error is not None]
+    if errors:
+        raise Exception(f"Failed to resolve the nameservers of gateway {gateway_id}: {errors}")
+    return [address for address, _ in resolved.values()]
@@ -0,0 +1,135 @@
+import random
+import time
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.catalog import get_catalog
+from ansible_collections.threefold.jsgrid.plugins.module_utils.network import is_node_deployed
+
+
+# nodes which didn't report for longer than this are considered down, as in the sdk nodes finder
+NODE_UP_TIMEOUT = 10 * 60
+
+
+def find_nodes(
+    zos,
+    pool_id=None,
+    farm_id=None,
+    farm_name=None,
+    country=None,
+    city=None,
+    cru=None,
+    mru=None,
+    sru=None,
+    hru=None,
+    ip_version=None,
+    public_ip=False,
+    excluded_nodes=None,
+    gateway=False,
+    managed=True,
+):
+    excluded_nodes = set(excluded_nodes or [])
+    filters = [zos.nodes_finder.filter_is_up, lambda node: node.node_id not in excluded_nodes]
+    if not gateway:
+        if ip_version == "ipv4":
+            filters.append(zos.nodes_finder.filter_public_ip4)
+        elif ip_version == "ipv6":
+            filters.append(zos.nodes_finder.filter_public_ip6)
+        if public_ip:
+            filters.append(zos.nodes_finder.filter_public_ip_bridge)
+
+        nodes = zos.nodes_finder.nodes_by_capacity(
+            farm_id=farm_id,
+            farm_name=farm_name,
+            country=country,
+            city=city,
+            cru=cru,
+            mru=mru,
+            sru=sru,
+            hru=hru,
+            pool_id=pool_id,
+        )
+    else:
+        nodes = zos.gateways_finder.gateways_search(
+            country=country,
+            city=city,
+        )
+        if pool_id:
+            pool = zos.pools.get(pool_id)
+            filters.append(
+                lambda node: node.node_id in pool.node_ids
+            )
+        if not farm_id and farm_name:
+            farm_id = zos._explorer.farms.get(farm_name=farm_name)
+        if farm_id:
+            filters.append(lambda node: node.farm_id == farm_id)
+        if managed:
+            filters.append(lambda node: len(node.managed_domains) != 0)
+
+    return list(filter(lambda node: all(f(node) for f in filters), nodes))
+
+
+def split_by_network(zos, nodes, network_name):
+    network = zos.network.load_network(network_name)
+    if not network:
+        return [], nodes
+    in_network = []
+    others = []
+    for node in nodes:
+        if is_node_deployed(network, node.node_id):
+            in_network.append(node)
+        else:
+            others.append(node)
+    return in_network, others
+
+
+def select_nodes(zos, no_nodes, network_name=None, randomize=True, **filters):
+    # returns no_nodes distinct node ids, preferring the nodes already in the network
+    nodes = find_nodes(zos, **filters)
+    if len(nodes) < no_nodes:
+        raise Exception(f"Found {len(nodes)} nodes while {no_nodes} are required")
+    if network_name:
+        in_network, others = split_by_network(zos, nodes, network_name)
+    else:
+        in_network, others = [], nodes
+    if randomize:
+        random.shuffle(in_network)
+        random.shuffle(others)
+    return [node.node_id for node in (in_network + others)[:no_nodes]]
+
+
+def free_capacity(node, resource):
+    return node["total_resources"].get(resource, 0) - node["reserved_resources"].get(resource, 0)
+
+
+def spread_storage_nodes(explorer, count, size, resource="hru", node_ids=None, farm_ids=None, excluded_nodes=None):
+    # picks count distinct nodes with at least size GB of free resource from the node catalog.
+    # farms take turns so the nodes are spread over as many farms as possible, the freest nodes first
+    now = time.time()
+    excluded_nodes = set(excluded_nodes or [])
+    by_farm = {}
+    for node_id, node in get_catalog(explorer, "nodes").items():
+        if node_id in excluded_nodes or (node_ids is not None and node_id not in node_ids):
+            continue
+        if farm_ids and node["farm_id"] not in farm_ids:
+            continue
+        updated = node.get("updated")
+        if isinstance(updated, (int, float)) and now - updated > NODE_UP_TIMEOUT:
+            continue
+        if free_capacity(node, resource) < size:
+            continue
+        by_farm.setdefault(node["farm_id"], []).append(node)
+    farms = []
+    for nodes in by_farm.values():
+        farms.append(sorted(nodes, key=lambda node: free_capacity(node, resource), reverse=True))
+    farms.sort(key=lambda nodes: free_capacity(nodes[0], resource), reverse=True)
+
+    selected = []
+    while len(selected) < count and farms:
+        for nodes in list(farms):
+            selected.append(nodes.pop(0))
+            if not nodes:
+                farms.remove(nodes)
+            if len(selected) == count:
+                break
+    if len(selected) < count:
+        raise Exception(f"Found {len(selected)} nodes with {size} GB of free {resource} while {count} are required")
+    return selected
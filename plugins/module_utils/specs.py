@@ -0,0 +1,38 @@
+# argument specs of the items of the list options. the items have no defaults, the options they don't set
+# are taken from the module options. the action plugins validate the args of every host with them before batching
+
+
+CONTAINER_ITEM_SPEC = dict(
+    pool_id=dict(type='int'),
+    network_name=dict(type='str'),
+    flist=dict(type='str'),
+    node_id=dict(type='str'),
+    ip_address=dict(type='str'),
+    env=dict(type='dict'),
+    cpu=dict(type='int'),
+    memory=dict(type='int'),
+    disk_size=dict(type='int'),
+    entrypoint=dict(type='str'),
+    interactive=dict(type='bool'),
+    secret_env=dict(type='dict', no_log=True),
+    public_ipv6=dict(type='bool'),
+    storage_url=dict(type='str'),
+    volume_mounts=dict(type='dict'),
+    description=dict(type='str'),
+    metadata=dict(type='str'),
+    log_channel_type=dict(type='str'),
+    log_channel_host=dict(type='str'),
+    log_channel_port=dict(type='str'),
+    log_channel_name=dict(type='str'),
+)
+
+VOLUME_ITEM_SPEC = dict(
+    pool_id=dict(type='int'),
+    node_id=dict(type='str'),
+    size=dict(type='int'),
+    type=dict(type='str', choices=['ssd', 'hdd']),
+    description=dict(type='str'),
+    metadata=dict(type='str'),
+    mount_point=dict(type='str'),
+    group=dict(type='str'),
+)
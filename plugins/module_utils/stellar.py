@@ -0,0 +1,92 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import run_concurrently
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import POOL_SIZE
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+
+
+HORIZON_URLS = {
+    "STD": "https://horizon.stellar.org",
+    "TEST": "https://horizon-testnet.stellar.org",
+}
+BALANCE_TTL = float(os.environ.get("JSGRID_BALANCE_TTL", 30))
+BALANCES_CACHE = os.path.join(STATE_DIR, "balances.json")
+
+_horizon_session = None
+
+
+@contextmanager
+def wallet_lock(wallet_name):
+    # transactions of the same wallet are submitted one at a time by all the forks on this
+    # machine, so they never race for the same account sequence number (tx_bad_seq)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, f"wallet-{wallet_name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            forget_balances(wallet_name)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def forget_balances(wallet_name):
+    # the cached balance of a wallet is stale once it paid for something
+    with SharedState(BALANCES_CACHE).locked() as state:
+        for address in [address for address, entry in state.items() if entry.get("wallet") == wallet_name]:
+            del state[address]
+
+
+def horizon_session():
+    # a pooled session of its own, horizon requests must not go through the explorer rate limiter and breaker
+    global _horizon_session
+    if _horizon_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _horizon_session = session
+    return _horizon_session
+
+
+def fetch_balances(address, network):
+    response = horizon_session().get(f"{HORIZON_URLS[network]}/accounts/{address}")
+    response.raise_for_status()
+    balances = {}
+    for item in response.json()["balances"]:
+        asset_code = "XLM" if item.get("asset_type") == "native" else item.get("asset_code")
+        balances[asset_code] = item["balance"]
+    return balances
+
+
+def get_balances(wallets, ttl=BALANCE_TTL):
+    # wallets is a mapping from name to wallet. balances fetched less than ttl seconds ago
+    # by any task on this machine are served from the cache
+    # returns a mapping from name to (balances, error)
+    cache = SharedState(BALANCES_CACHE)
+    now = time.time()
+    accounts = {name: (wallet.address, wallet.network.value) for name, wallet in wallets.items()}
+    balances = {}
+    if ttl > 0:
+        with cache.locked() as state:
+            for name, account in accounts.items():
+                entry = state.get(account[0])
+                if entry and now - entry["fetched_at"] < ttl:
+                    balances[name] = (entry["balances"], None)
+    missing = [name for name in accounts if name not in balances]
+    results = run_concurrently(lambda name: fetch_balances(*accounts[name]), missing)
+    balances.update(zip(missing, results))
+    if ttl > 0:
+        with cache.locked() as state:
+            for name in missing:
+                fetched, error = balances[name]
+                if error is None:
+                    state[accounts[name][0]] = {"balances": fetched, "fetched_at": now, "wallet": name}
+            for address in [address for address, entry in state.items() if now - entry["fetched_at"] >= ttl]:
+                del state[address]
+    return balances
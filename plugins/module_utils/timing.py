@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from gevent import getcurrent
+
+
+TRACE_FILE = os.environ.get("JSGRID_TRACE_FILE")
+
+
+class Frame:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        # time spent in explorer requests sent while this phase was the innermost one of its greenlet
+        self.explorer = 0.0
+
+
+class Timer:
+    # per process phase totals. phases run in greenlets can overlap, so the totals of
+    # concurrent phases (like the waits of many workloads) can be larger than the run time
+    def __init__(self):
+        self.started_at = time.time()
+        self.timings = {}
+        self.explorer_requests = 0
+        self.spans = []
+        self._frames = {}
+
+    def add(self, name, duration, start=None, **attrs):
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+        if TRACE_FILE:
+            self.spans.append(dict(phase=name, start=start or time.time() - duration, duration=duration, **attrs))
+
+    @contextmanager
+    def phase(self, name, record=True):
+        greenlet = getcurrent()
+        frames = self._frames.setdefault(greenlet, [])
+        frame = Frame(name)
+        frames.append(frame)
+        try:
+            yield frame
+        finally:
+            frames.pop()
+            if not frames:
+                del self._frames[greenlet]
+            frame.duration = time.time() - frame.start
+            if record:
+                self.add(name, frame.duration, frame.start)
+
+    def explorer_request(self, method, url, start, duration, throttled):
+        self.explorer_requests += 1
+        if throttled:
+            self.add("throttle", throttled, start)
+        self.add("explorer", duration - throttled, start + throttled, method=method, path=urlparse(url).path)
+        frames = self._frames.get(getcurrent())
+        if frames:
+            frames[-1].explorer += duration
+
+    def report(self):
+        timings = {name: round(duration, 3) for name, duration in self.timings.items()}
+        timings["total"] = round(time.time() - self.started_at, 3)
+        timings["explorer_requests"] = self.explorer_requests
+        return timings
+
+    def write_trace(self, module_name):
+        if not TRACE_FILE or not self.spans:
+            return
+        try:
+            with open(TRACE_FILE, "a") as f:
+                for span in self.spans:
+                    f.write(json.dumps(dict(module=module_name, pid=os.getpid(), **span)) + "\n")
+        except OSError:
+            pass
+        self.spans = []
+
+
+TIMER = Timer()
+
+# jumpscale is imported here so the modules importing this first get the import time in their timings
+with TIMER.phase("import"):
+    from jumpscale.loader import j  # noqa: F401
+
+
+def instrument_zos(zos):
+    # deploy signs the workload then posts it, the post is the explorer time spent inside it
+    workloads = zos.workloads
+    if getattr(workloads, "_jsgrid_timed", False):
+        return zos
+    deploy = workloads.deploy
+    wait = workloads.wait
+
+    def timed_deploy(workload):
+        with TIMER.phase("deploy", record=False) as frame:
+            try:
+                return deploy(workload)
+            finally:
+                TIMER.add("sign", max(time.time() - frame.start - frame.explorer, 0.0), frame.start)
+                TIMER.add("deploy", frame.explorer, frame.start)
+
+    def timed_wait(*args, **kwargs):
+        with TIMER.phase("wait"):
+            return wait(*args, **kwargs)
+
+    workloads.deploy = timed_deploy
+    workloads.wait = timed_wait
+    workloads._jsgrid_timed = True
+    return zos
+
+
+def instrument(module):
+    # adds the timings to every exit_json and fail_json of the module and writes the trace spans
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+
+    def timed_exit_json(**kwargs):
+        kwargs["timings"] = TIMER.report()
+        TIMER.write_trace(module._name)
+        exit_json(**kwargs)
+
+    def timed_fail_json(msg, **kwargs):
+        kwargs["timings"] = TIMER.report()
+        TIMER.write_trace(module._name)
+        fail_json(msg=msg, **kwargs)
+
+    module.exit_json = timed_exit_json
+    module.fail_json = timed_fail_json
+    return module
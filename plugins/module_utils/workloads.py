@@ -0,0 +1,65 @@
+from jumpscale.clients.explorer.models import NextAction
+
+
+def filter_workload(workload, filters):
+    for key, val in filters.items():
+        split_keys = key.split(".")
+        attr = workload
+        for key in split_keys:
+            if not hasattr(attr, key):
+                return False
+            attr = getattr(attr, key)
+        if attr != val:
+            return False
+    return True
+
+
+def list_workloads(zos, owner_tid, types=None, match=None, next_action=NextAction.DEPLOY):
+    # types are lower case workload type names as used by the workload module
+    workloads = []
+    for workload in zos.workloads.list(owner_tid, next_action.name if next_action else None):
+        if types and workload.info.workload_type.name.lower() not in types:
+            continue
+        if match and not filter_workload(workload, match):
+            continue
+        workloads.append(workload)
+    return workloads
+
+
+STACK_MARKER = "jsgrid-stack"
+
+
+def stack_marker(stack, name, spec_hash):
+    return f"{STACK_MARKER}:{stack}:{name}:{spec_hash}"
+
+
+def parse_stack_marker(description):
+    # returns (stack, name, spec_hash) or None for workloads that aren't part of a stack
+    if not description or not description.startswith(f"{STACK_MARKER}:"):
+        return None
+    parts = description[len(STACK_MARKER) + 1:].split(":")
+    if len(parts) != 3:
+        return None
+    return tuple(parts)
+
+
+def index_stack(workloads, stack):
+    # maps the names of the items of the stack to a list of (workload, spec_hash) of their live workloads
+    index = {}
+    for workload in workloads:
+        marker = parse_stack_marker(workload.info.description)
+        if marker and marker[0] == stack:
+            index.setdefault(marker[1], []).append((workload, marker[2]))
+    return index
+
+
+def iter_workload_pages(explorer, owner_tid, start_page=1, next_action=None):
+    # yields (page, workloads) from start_page up to the last page. the explorer returns the workloads ordered by wid
+    # so the pages before the one holding the newest known workload don't have to be fetched again
+    page = start_page
+    while True:
+        workloads, pages = explorer.workloads._query(owner_tid, next_action, page=page)
+        yield page, workloads
+        if page >= pages:
+            return
+        page += 1
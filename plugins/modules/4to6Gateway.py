@@ -23,9 +23,24 @@ options:
         required: true
         type: str
     public_key:
-        description: wireguard public key
-        required: true
+        description: wireguard public key. when omitted, a keypair is generated locally for every tunnel and its private key is written in the configuration
+        required: false
+        type: str
+    count:
+        description: number of tunnels to create. must be 1 when public_key is specified
+        required: false
+        type: int
+        default: 1
+    config_dir:
+        description: directory the wireguard configuration files are written to
+        required: false
         type: str
+        default: "."
+    concurrency:
+        description: maximum number of workloads deployed at the same time
+        required: false
+        type: int
+        default: 10
     identity_name:
         description: identity instance name (if not provided will use the default identity)
         required: false
@@ -41,7 +56,9 @@ options:
         type: str
         default: ""
     wait:
-        description: wait for workload to be successful before exit. defaults to True
+        description:
+            - wait for workload to be successful before exit. defaults to True
+            - must be true when public_key isn't specified, since the configurations with the generated private keys are written after the wait
         required: False
         type: bool
         default: True
@@ -65,6 +82,14 @@ EXAMPLES = r'''
         metadata: "test: test"
       register: result
 
+    - name: "Test create 4to6Gateway tunnels for 10 users"
+      4to6Gateway:
+        pool: 20
+        gateway: EwPS7nPZHd5KH6YH7PtbmUpJUyWgseqsqS7cGhjXLUjz
+        count: 10
+        config_dir: /tmp/wireguard
+      register: result
+
     - debug:
         msg: "{{ result['message']}}"
 '''
@@ -81,17 +106,71 @@ message:
 wgconf:
     description: path to the generate wireguard configuration file.
     type: str
+tunnels:
+    description: wid, public key, message and configuration path of every tunnel.
+    type: list
+    returned: always
+    sample: "[{'wid': 1185, 'public_key': 'f3FMOnxxNu/VTGaCcUuh9zEu5G+IHJ2CWqVw8VEbBUU=', 'success': True, 'message': '', 'wgconf': '/tmp/wireguard/1185.conf'}]"
 '''
+import base64
+import os
+import tempfile
 from textwrap import dedent
 
 from ansible.module_utils.basic import AnsibleModule
+from jinja2 import Template
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from nacl.public import PrivateKey
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_4to6
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads, run_concurrently
+
+
+PRIVATE_KEY_PLACEHOLDER = "enter private key here"
+WG_CONFIG_TEMPLATE = Template(dedent("""\
+    [Interface]
+    Address = {{cfg.ips[0]}}
+    PrivateKey = {{privatekey}}
+    {% for peer in cfg.peers %}
+    [Peer]
+    PublicKey = {{peer.public_key}}
+    AllowedIPs = {{",".join(peer.allowed_ips)}}
+    {% if peer.endpoint -%}
+    Endpoint = {{peer.endpoint}}
+    {% endif %}
+    {% endfor %}
+        """))
+
+
+def generate_keypair():
+    private_key = PrivateKey.generate()
+    return base64.b64encode(bytes(private_key)).decode(), base64.b64encode(bytes(private_key.public_key)).decode()
+
+
+def write_config(config_dir, wid, data):
+    # written to a temporary file and renamed so that a config file is never seen half written
+    path = os.path.join(config_dir, f"{wid}.conf")
+    fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix=f".{wid}.", suffix=".conf")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return path
+
 
 def run_module():
     module_args = dict(
         pool=dict(type='int', required=True),
         gateway=dict(type='str', required=True),
-        public_key=dict(type='str', required=True),
+        public_key=dict(type='str', required=False),
+        count=dict(type='int', required=False, default=1),
+        config_dir=dict(type='path', required=False, default="."),
+        concurrency=dict(type='int', required=False, default=10),
         identity_name=dict(type='str', required=False),
         description=dict(type='str', required=False, default=""),
         metadata=dict(type='str', required=False, default=""),
@@ -104,67 +183,68 @@ def run_module():
         changed=False,
         message=None,
         wid=None,
+        tunnels=[],
     )
 
    
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
     
+    if module.params['public_key'] and module.params['count'] != 1:
+        module.fail_json(msg="count must be 1 when public_key is specified", **result)
+    if module.params['count'] < 1:
+        module.fail_json(msg="count must be at least 1", **result)
+    if not module.params['public_key'] and not module.params['wait']:
+        # the configuration holding the generated private key can only be written once the workload is deployed
+        module.fail_json(msg="wait can't be false when the keys are generated, specify public_key instead", **result)
 
     if module.params['identity_name']:
         identity_name = module.params['identity_name']
     else:
         identity_name = j.core.identity.me.instance_name
-    zos = j.sals.zos.get(identity_name)
+    zos = get_zos(identity_name)
 
     gateway_id = module.params['gateway']
     pool_id = module.params['pool']
-    public_key = module.params['public_key']
     description = module.params['description']
     metadata = module.params['metadata']
-    privatekey = "enter private key here"
+    config_dir = module.params['config_dir']
 
-    workload = zos.gateway.gateway_4to6(gateway_id, public_key ,pool_id)
-    if metadata:
-        workload.info.metadata = metadata
-    if description:
-        workload.info.description = description
-    wid = zos.workloads.deploy(workload)
+    if module.params['public_key']:
+        keypairs = [(PRIVATE_KEY_PLACEHOLDER, module.params['public_key'])]
+    else:
+        keypairs = [generate_keypair() for _ in range(module.params['count'])]
 
-    result["changed"] = True
-    result.update({"wid": wid, "message": ""})
+    workloads = [build_4to6(zos, gateway_id, public_key, pool_id, description, metadata) for _, public_key in keypairs]
+    outcomes = deploy_workloads(zos, workloads, module.params['concurrency'], module.params['wait'])
+    tunnels = []
+    for (_, public_key), outcome in zip(keypairs, outcomes):
+        tunnels.append(dict(public_key=public_key, wgconf=None, **outcome))
+    result["tunnels"] = tunnels
+    result["changed"] = any(tunnel["wid"] for tunnel in tunnels)
+    result.update({"wid": tunnels[0]["wid"], "message": tunnels[0]["message"]})
 
     if module.params["wait"]:
-        success, msg = zos.workloads.wait(wid)
-        result["changed"] = success
-        result["message"] = msg
-        if not success:
-            module.fail_json(msg=msg, **result)
-
-    reservation_result = zos.workloads.get(wid).info.result
-    cfg = j.data.serializers.json.loads(reservation_result.data_json)
-    wgconfigtemplate = """\
-    [Interface]
-    Address = {{cfg.ips[0]}}
-    PrivateKey = {{privatekey}}
-    {% for peer in cfg.peers %}
-    [Peer]
-    PublicKey = {{peer.public_key}}
-    AllowedIPs = {{",".join(peer.allowed_ips)}}
-    {% if peer.endpoint -%}
-    Endpoint = {{peer.endpoint}}
-    {% endif %}
-    {% endfor %}
-        """
-    wgconfig_path = f"./{wid}.conf"
-    wgconfig_data = j.tools.jinja2.render_template(
-        template_text=dedent(wgconfigtemplate), cfg=cfg, privatekey=privatekey
-    )
-    j.sals.fs.touch(wgconfig_path)
-    j.sals.fs.write_file(wgconfig_path, wgconfig_data)
-    result["wgconf"] = wgconfig_path
+        # the configs of the successful tunnels are written before failing, their generated private keys exist only here
+        j.sals.fs.mkdirs(config_dir)
+        deployed = [(privatekey, tunnel) for (privatekey, _), tunnel in zip(keypairs, tunnels) if tunnel["success"]]
+        workloads = run_concurrently(zos.workloads.get, [tunnel["wid"] for _, tunnel in deployed])
+        for (privatekey, tunnel), (workload, error) in zip(deployed, workloads):
+            try:
+                if error is not None:
+                    raise error
+                cfg = j.data.serializers.json.loads(workload.info.result.data_json)
+                tunnel["wgconf"] = write_config(config_dir, tunnel["wid"], WG_CONFIG_TEMPLATE.render(cfg=cfg, privatekey=privatekey))
+            except Exception as e:
+                tunnel.update(success=False, message=f"Failed to write the configuration of workload {tunnel['wid']}: {e}")
+        result["wgconf"] = tunnels[0]["wgconf"]
+        result["message"] = tunnels[0]["message"]
 
+    failed = [tunnel for tunnel in tunnels if not tunnel["success"]]
+    if failed:
+        module.fail_json(msg=f"{len(failed)} of {len(tunnels)} 4to6 gateways failed: {failed[0]['message']}", **result)
 
     module.exit_json(**result)
 
@@ -174,4 +254,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
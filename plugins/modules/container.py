@@ -1,7 +1,11 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_container
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads
+from ansible_collections.threefold.jsgrid.plugins.module_utils.specs import CONTAINER_ITEM_SPEC
 
 DOCUMENTATION = r'''
 ---
@@ -11,7 +15,11 @@ short_description: container module for zos
 
 version_added: "1.0.0"
 
-description: module to create containers for TF Grid.
+description:
+    - module to create containers for TF Grid.
+    - with the containers option many containers are deployed concurrently and waited on together.
+    - when batch is true, the collection action plugin coalesces the container tasks of all the hosts in the play batch into
+      one run of the containers mode. see the batch option.
 
 options:
     identity_name:
@@ -19,24 +27,24 @@ options:
         required: False
         type: str
     pool_id:
-        description: capacity pool id to deploy the container in
-        required: True
+        description: capacity pool id to deploy the container in. required unless every item of containers sets it
+        required: False
         type: int
     network_name:
-        description: name of the network to attach the container to
-        required: True
+        description: name of the network to attach the container to. required unless every item of containers sets it
+        required: False
         type: str
     flist:
-        description: url of the flist to use for the container
-        required: True
+        description: url of the flist to use for the container. required unless every item of containers sets it
+        required: False
         type: str
     node_id:
-        description: id of the node to deploy the container on
-        required: True
+        description: id of the node to deploy the container on. required unless containers is specified
+        required: False
         type: str
     ip_address:
-        description: private ip address from the chosen network to be assigned to the container
-        required: True
+        description: private ip address from the chosen network to be assigned to the container. required unless every item of containers sets it
+        required: False
         type: str
     env:
         description: environment vars to be passed to the container (stored in the explorer as raw text)
@@ -109,12 +117,36 @@ options:
         description: name of the log channel to be used for the container
         required: False
         type: str
+    containers:
+        description:
+            - list of containers to deploy. every item is a dict that can set any of the container options except identity_name,
+              wait, concurrency and batch (defaulting to the module options)
+            - an item that is missing options or can't be built fails on its own, the other items are still deployed
+        required: False
+        type: list
+        elements: dict
+    concurrency:
+        description: maximum number of containers deployed at the same time
+        required: False
+        type: int
+        default: 10
     wait:
         description: wait for workload to be successful before exit. defaults to True
         required: False
         type: bool
         default: True
-    
+    batch:
+        description:
+            - handled by the action plugin. when true, the task invocations of the hosts in the play batch that run at the same
+              time are deployed by one of them in containers mode and each host gets its own wid and message back.
+            - the args of every host are validated on their own, a host with invalid args fails without failing the batch.
+            - the batch is deployed with the connection of the first host reaching the task, so it's meant for tasks running on
+              the controller (delegate_to localhost or a local connection). hosts with different identity_name, wait or
+              concurrency are deployed by separate runs.
+            - tasks with a loop and tasks using containers are never batched.
+        required: False
+        type: bool
+        default: False
 
 author:
     - Maged Motawea (@m-motawea)
@@ -129,17 +161,92 @@ message:
     description: message returned in the workload result in case of failures.
     type: str
     returned: always
+containers:
+    description: wid, node id, ip address, success and message of every container in the same order as the containers option.
+    type: list
+    returned: when containers is specified
+    sample: "[{'wid': 1190, 'node_id': '26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY', 'ip_address': '10.240.2.2', 'success': True, 'message': ''}]"
+batch_size:
+    description: number of hosts deployed together when the task was batched by the action plugin.
+    type: int
+    returned: when batched
 '''
 
+CONTAINER_KEYS = [
+    "pool_id", "network_name", "flist", "node_id", "ip_address", "env", "cpu", "memory", "disk_size", "entrypoint",
+    "interactive", "secret_env", "public_ipv6", "storage_url", "volume_mounts", "description", "metadata",
+    "log_channel_type", "log_channel_host", "log_channel_port", "log_channel_name",
+]
+REQUIRED_KEYS = ["pool_id", "network_name", "flist", "node_id", "ip_address"]
+
+
+def container_from_params(zos, params):
+    log_channel = None
+    if all([params["log_channel_type"], params["log_channel_host"], params["log_channel_port"], params["log_channel_name"]]):
+        log_channel = dict(
+            type=params["log_channel_type"],
+            host=params["log_channel_host"],
+            port=params["log_channel_port"],
+            name=params["log_channel_name"],
+        )
+    return build_container(
+        zos,
+        node_id=params["node_id"],
+        network_name=params["network_name"],
+        ip_address=params["ip_address"],
+        flist=params["flist"],
+        pool_id=params["pool_id"],
+        env=params["env"],
+        cpu=params["cpu"],
+        memory=params["memory"],
+        disk_size=params["disk_size"],
+        entrypoint=params["entrypoint"],
+        interactive=params["interactive"],
+        secret_env=params["secret_env"],
+        public_ipv6=params["public_ipv6"],
+        storage_url=params["storage_url"],
+        volume_mounts=params["volume_mounts"],
+        log_channel=log_channel,
+        description=params["description"],
+        metadata=params["metadata"],
+    )
+
+
+def create_containers(module, zos):
+    # an item that can't be built fails on its own, the other items are still deployed
+    params = module.params
+    items = []
+    outcomes = []
+    workloads = []
+    for item in params["containers"]:
+        item = dict(item)
+        for key in CONTAINER_KEYS:
+            if item.get(key) is None:
+                item[key] = params[key]
+        items.append(item)
+        missing = [key for key in REQUIRED_KEYS if item[key] is None]
+        try:
+            if missing:
+                raise Exception(f"container is missing {', '.join(missing)}")
+            workloads.append(container_from_params(zos, item))
+            outcomes.append(None)
+        except Exception as e:
+            outcomes.append(dict(wid=None, success=False, message=str(e)))
+
+    deployed = iter(deploy_workloads(zos, workloads, params["concurrency"], params["wait"]))
+    outcomes = [outcome or next(deployed) for outcome in outcomes]
+    return [dict(node_id=item["node_id"], ip_address=item["ip_address"], **outcome) for item, outcome in zip(items, outcomes)]
+
+
 def run_module():
     module_args = dict(
         identity_name=dict(type='str', required=False),
-        # required args
-        pool_id=dict(type='int', required=True),
-        network_name=dict(type='str', required=True),
-        flist=dict(type='str', required=True),
-        node_id=dict(type='str', required=True),
-        ip_address=dict(type='str', required=True),
+        # required args unless containers is used
+        pool_id=dict(type='int', required=False),
+        network_name=dict(type='str', required=False),
+        flist=dict(type='str', required=False),
+        node_id=dict(type='str', required=False),
+        ip_address=dict(type='str', required=False),
         # args with default vals
         env=dict(type='dict', required=False, default={}),
         cpu=dict(type='int', required=False, default=1),
@@ -158,8 +265,12 @@ def run_module():
         log_channel_host=dict(type='str', required=False),
         log_channel_port=dict(type='str', required=False),
         log_channel_name=dict(type='str', required=False),
+        containers=dict(type='list', elements='dict', required=False, options=CONTAINER_ITEM_SPEC),
+        concurrency=dict(type='int', required=False, default=10),
         # wait for workload flag
         wait=dict(type='bool', required=False, default=True),
+        # handled by the action plugin
+        batch=dict(type='bool', required=False, default=False),
     )
 
     result = dict(
@@ -170,45 +281,24 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[['node_id', 'containers']],
+        required_by={'node_id': REQUIRED_KEYS},
     )
+    instrument(module)
 
-    zos = j.sals.zos.get(module.params['identity_name'])
-    secret_env = {}
-    if module.params["secret_env"]:
-        for key, val in module.params["secret_env"].items():
-            secret_env[key] = zos.container.encrypt_secret(module.params["node_id"], str(val))
-    cont = zos.container.create(
-        node_id=module.params["node_id"],
-        network_name=module.params["network_name"],
-        ip_address=module.params["ip_address"],
-        flist=module.params["flist"],
-        capacity_pool_id=module.params["pool_id"],
-        env=module.params["env"],
-        cpu=module.params["cpu"],
-        memory=module.params["memory"],
-        disk_size=module.params["disk_size"],
-        entrypoint=module.params["entrypoint"],
-        interactive=module.params["interactive"],
-        secret_env=secret_env,
-        public_ipv6=module.params["public_ipv6"],
-        storage_url=module.params["storage_url"],
-    )
+    zos = get_zos(module.params['identity_name'])
+    if module.params['containers']:
+        try:
+            result['containers'] = create_containers(module, zos)
+        except Exception as e:
+            module.fail_json(msg=str(e), **result)
+        result['changed'] = any(container['wid'] for container in result['containers'])
+        failed = [container for container in result['containers'] if not container['success']]
+        if failed:
+            module.fail_json(msg=f"{len(failed)} of {len(result['containers'])} containers failed: {failed[0]['message']}", **result)
+        module.exit_json(**result)
 
-    if all([module.params["log_channel_type"], module.params["log_channel_host"], module.params["log_channel_port"], module.params["log_channel_name"]]):
-        zos.container.add_logs(
-            container=cont,
-            channel_type=module.params["log_channel_type"],
-            channel_host=module.params["log_channel_host"],
-            channel_port=module.params["log_channel_port"],
-            channel_name=module.params["log_channel_name"],
-            
-        )
-    if module.params["volume_mounts"]:
-        for mount_point, vol_id in module.params["volume_mounts"].items():
-            zos.volume.attach_existing(cont, f"{vol_id}-1", mount_point)
-    
-    cont.info.metadata = module.params["metadata"]
-    cont.info.description = module.params["description"]
+    cont = container_from_params(zos, module.params)
     wid = zos.workloads.deploy(cont)
     
     result["changed"] = True
@@ -0,0 +1,359 @@
+#!/usr/bin/python
+
+DOCUMENTATION = r'''
+---
+module: container_rollout
+
+short_description: container_rollout module replaces a set of running containers with a new spec
+
+version_added: "1.0.0"
+
+description:
+    - container_rollout module finds the running containers matching description, metadata or match and replaces them
+      with containers using the new spec. options which aren't specified are copied from every old container,
+      and every new container is deployed on the node of the container it replaces.
+    - up to max_unavailable containers are replaced in place, they are decommissioned then redeployed with the same ip.
+    - up to max_surge containers are replaced by deploying the new container first with a new ip on the same node,
+      the old one is decommissioned once the new one is up. containers with volumes are always replaced in place.
+    - each replacement deploys, waits and decommissions on its own so the next container starts as soon as a slot is free.
+      the rollout stops taking new containers after the first failure.
+
+options:
+    identity_name:
+        description: identity instance name (if not provided will use the default identity)
+        required: false
+        type: str
+    description:
+        description: replace the containers with this description
+        required: false
+        type: str
+    metadata:
+        description: replace the containers whose decrypted metadata contains these keys and values
+        required: false
+        type: dict
+    match:
+        description: replace the containers matching these attributes, as in the workload module (e.g. flist)
+        required: false
+        type: dict
+        default: {}
+    max_unavailable:
+        description: number of containers replaced in place at the same time
+        required: false
+        type: int
+        default: 1
+    max_surge:
+        description: number of containers replaced by deploying the new container first at the same time
+        required: false
+        type: int
+        default: 0
+    flist:
+        description: new flist
+        required: false
+        type: str
+    env:
+        description: new environment variables
+        required: false
+        type: dict
+    secret_env:
+        description: new secret environment variables
+        required: false
+        type: dict
+    cpu:
+        description: new number of cpus
+        required: false
+        type: int
+    memory:
+        description: new memory size in MiB
+        required: false
+        type: int
+    disk_size:
+        description: new root disk size in MiB
+        required: false
+        type: int
+    entrypoint:
+        description: new entrypoint
+        required: false
+        type: str
+    interactive:
+        description: new interactive flag
+        required: false
+        type: bool
+    storage_url:
+        description: new storage url
+        required: false
+        type: str
+    new_description:
+        description: description of the new containers
+        required: false
+        type: str
+    new_metadata:
+        description: metadata of the new containers
+        required: false
+        type: str
+    force:
+        description: replace the containers even when they already use the new spec
+        required: false
+        type: bool
+        default: false
+
+
+author:
+    - Maged Motawea (@m-motawea)
+'''
+
+EXAMPLES = r'''
+- name: "Upgrade the web containers two at a time"
+  threefold.jsgrid.container_rollout:
+    description: "web"
+    flist: https://hub.grid.tf/myorg/web-1.2.flist
+    env:
+      RELEASE: "1.2"
+    max_unavailable: 2
+  register: result
+'''
+
+RETURN = r'''
+containers:
+    description: outcome of every matched container.
+    type: list
+    returned: always
+    sample: "[{'old_wid': 1180, 'wid': 1190, 'node_id': '26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY', 'ip': '10.240.2.2', 'strategy': 'in_place', 'success': True, 'message': ''}]"
+'''
+
+import gevent
+from gevent.event import Event
+from gevent.queue import Empty, Queue
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_container, set_info
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import wait_until_decommissioned
+from ansible_collections.threefold.jsgrid.plugins.module_utils.metadata import identity_box, load_metadata
+from ansible_collections.threefold.jsgrid.plugins.module_utils.network import allocate_ips
+from ansible_collections.threefold.jsgrid.plugins.module_utils.workloads import list_workloads
+
+
+SPEC_KEYS = ["flist", "env", "secret_env", "cpu", "memory", "disk_size", "entrypoint", "interactive", "storage_url"]
+
+
+def current_spec(workload):
+    return dict(
+        flist=workload.flist,
+        env=dict(workload.environment or {}),
+        cpu=workload.capacity.cpu,
+        memory=workload.capacity.memory,
+        disk_size=workload.capacity.disk_size,
+        entrypoint=workload.entrypoint,
+        interactive=workload.interactive,
+        storage_url=workload.hub_url,
+    )
+
+
+def needs_update(workload, changes):
+    # secret env values are encrypted for the node so they can't be compared
+    if "secret_env" in changes:
+        return True
+    current = current_spec(workload)
+    return any(current[key] != value for key, value in changes.items())
+
+
+def matches_metadata(box, workload, metadata):
+    if not metadata:
+        return True
+    current = load_metadata(box, workload.info.metadata)
+    return current is not None and all(current.get(key) == value for key, value in metadata.items())
+
+
+def build_replacement(zos, workload, changes, ip_address, description, metadata):
+    spec = current_spec(workload)
+    spec.update(changes)
+    connection = workload.network_connection[0]
+    new = build_container(
+        zos,
+        node_id=workload.info.node_id,
+        network_name=connection.network_id,
+        ip_address=ip_address,
+        flist=spec["flist"],
+        pool_id=workload.info.pool_id,
+        env=spec["env"],
+        cpu=spec["cpu"],
+        memory=spec["memory"],
+        disk_size=spec["disk_size"],
+        entrypoint=spec["entrypoint"],
+        interactive=spec["interactive"],
+        secret_env=spec.get("secret_env"),
+        public_ipv6=connection.public_ip6,
+        storage_url=spec["storage_url"],
+    )
+    if "secret_env" not in changes:
+        # the node didn't change so the old encrypted values are still valid
+        new.secret_environment = dict(workload.secret_environment or {})
+    for volume in workload.volumes:
+        zos.volume.attach_existing(new, volume.volume_id, volume.mountpoint)
+    new.logs = workload.logs
+    return set_info(new, description or workload.info.description, metadata or workload.info.metadata)
+
+
+def deploy_and_wait(zos, workload):
+    wid = zos.workloads.deploy(workload)
+    success, message = zos.workloads.wait(wid)
+    if not success:
+        raise Exception(f"workload {wid} failed: {message}")
+    return wid
+
+
+def decommission(zos, wid, deleted=False):
+    zos.workloads.decomission(wid)
+    wait_until_decommissioned(zos, wid, deleted=deleted)
+
+
+def replace_container(zos, workload, changes, params, networks, surge):
+    # a volume can't be mounted by the old and the new container at the same time
+    surge = surge and not workload.volumes
+    connection = workload.network_connection[0]
+    outcome = dict(
+        old_wid=workload.id,
+        wid=None,
+        node_id=workload.info.node_id,
+        ip=connection.ipaddress,
+        strategy="surge" if surge else "in_place",
+        success=False,
+        message="",
+    )
+    try:
+        if surge:
+            if connection.network_id not in networks:
+                networks[connection.network_id] = zos.network.load_network(connection.network_id)
+            outcome["ip"] = allocate_ips(networks[connection.network_id], [workload.info.node_id])[0]
+        new = build_replacement(zos, workload, changes, outcome["ip"], params["new_description"], params["new_metadata"])
+        if surge:
+            outcome["wid"] = deploy_and_wait(zos, new)
+            decommission(zos, workload.id)
+        else:
+            # the old container must be gone from the node before its ip and volumes are reused
+            decommission(zos, workload.id, deleted=True)
+            outcome["wid"] = deploy_and_wait(zos, new)
+        outcome["success"] = True
+    except Exception as e:
+        outcome["message"] = str(e)
+    return outcome
+
+
+def rollout(zos, workloads, changes, params):
+    # max_surge + max_unavailable greenlets take containers from a shared queue until it's empty or a replacement failed
+    queue = Queue()
+    for workload in workloads:
+        queue.put(workload)
+    aborted = Event()
+    networks = {}
+    outcomes = {}
+
+    def worker(surge):
+        while not aborted.is_set():
+            try:
+                workload = queue.get_nowait()
+            except Empty:
+                return
+            outcome = replace_container(zos, workload, changes, params, networks, surge)
+            outcomes[workload.id] = outcome
+            if not outcome["success"]:
+                aborted.set()
+
+    greenlets = [gevent.spawn(worker, True) for _ in range(params["max_surge"])]
+    greenlets += [gevent.spawn(worker, False) for _ in range(params["max_unavailable"])]
+    gevent.joinall(greenlets)
+
+    results = []
+    for workload in workloads:
+        outcome = outcomes.get(workload.id)
+        if outcome is None:
+            outcome = dict(
+                old_wid=workload.id,
+                wid=None,
+                node_id=workload.info.node_id,
+                ip=workload.network_connection[0].ipaddress,
+                strategy=None,
+                success=False,
+                message="not replaced because the rollout was aborted",
+            )
+        results.append(outcome)
+    return results
+
+
+def run_module():
+    module_args = dict(
+        identity_name=dict(type='str', required=False),
+        description=dict(type='str', required=False),
+        metadata=dict(type='dict', required=False),
+        match=dict(type='dict', required=False, default={}),
+        max_unavailable=dict(type='int', required=False, default=1),
+        max_surge=dict(type='int', required=False, default=0),
+        flist=dict(type='str', required=False),
+        env=dict(type='dict', required=False),
+        secret_env=dict(type='dict', required=False, no_log=True),
+        cpu=dict(type='int', required=False),
+        memory=dict(type='int', required=False),
+        disk_size=dict(type='int', required=False),
+        entrypoint=dict(type='str', required=False),
+        interactive=dict(type='bool', required=False),
+        storage_url=dict(type='str', required=False),
+        new_description=dict(type='str', required=False),
+        new_metadata=dict(type='str', required=False),
+        force=dict(type='bool', required=False, default=False),
+    )
+
+    result = dict(
+        changed=False,
+        containers=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_one_of=[['description', 'metadata', 'match']],
+        supports_check_mode=True,
+    )
+    instrument(module)
+
+    params = module.params
+    if params["max_unavailable"] < 0 or params["max_surge"] < 0 or params["max_unavailable"] + params["max_surge"] < 1:
+        module.fail_json(msg="max_unavailable and max_surge can't be negative and at least one of them must be positive", **result)
+
+    changes = {key: params[key] for key in SPEC_KEYS if params[key] is not None}
+    identity = j.core.identity.find(params['identity_name']) if params['identity_name'] else j.core.identity.me
+    zos = get_zos(params['identity_name'])
+    box = identity_box(identity)
+
+    match = dict(params["match"])
+    if params["description"] is not None:
+        match["info.description"] = params["description"]
+    workloads = list_workloads(zos, identity.tid, ["container"], match)
+    workloads = [workload for workload in workloads if matches_metadata(box, workload, params["metadata"])]
+    if not params["force"]:
+        workloads = [workload for workload in workloads if needs_update(workload, changes)]
+    workloads = sorted(workloads, key=lambda workload: workload.id)
+
+    if module.check_mode or not workloads:
+        result["changed"] = bool(workloads)
+        result["containers"] = [
+            dict(old_wid=workload.id, wid=None, node_id=workload.info.node_id, ip=workload.network_connection[0].ipaddress,
+                 strategy=None, success=True, message="")
+            for workload in workloads
+        ]
+        module.exit_json(**result)
+
+    result["containers"] = rollout(zos, workloads, changes, params)
+    result["changed"] = any(outcome["strategy"] for outcome in result["containers"])
+    failed = [outcome for outcome in result["containers"] if not outcome["success"]]
+    if failed:
+        module.fail_json(msg=f"rollout aborted, {len(failed)} of {len(workloads)} containers weren't replaced: {failed[0]['message']}", **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
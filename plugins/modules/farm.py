@@ -1,7 +1,10 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_explorer
+from ansible_collections.threefold.jsgrid.plugins.module_utils.catalog import get_catalog, project
 
 
 
@@ -33,6 +36,20 @@ options:
         required: False
         type: str
         default: selected_nodes
+    fields:
+        description: only return these fields of the farm. nested fields are separated by dots e.g. location.country
+        required: False
+        type: list
+    use_cache:
+        description: serve the farm from the farm catalog cached on this machine. the catalog is listed again when it's older than cache_ttl
+        required: False
+        type: bool
+        default: False
+    cache_ttl:
+        description: maximum age of the cached catalog in seconds
+        required: False
+        type: int
+        default: 300
 
 
 author:
@@ -90,12 +107,25 @@ ansible_facts:
 '''
 
 
+def find_cached_farm(explorer, params):
+    farms = get_catalog(explorer, "farms", params["cache_ttl"])
+    if params["farm_id"] is not None:
+        return farms.get(str(params["farm_id"]))
+    for farm in farms.values():
+        if farm["name"] == params["farm_name"]:
+            return farm
+    return None
+
+
 def run_module():
     module_args = dict(
         identity_name=dict(type='str', required=False),
         farm_id=dict(type='int', required=False, default=None),
         farm_name=dict(type='str', required=False, default=None),
         fact_name=dict(type='str', required=False, default="farm"),
+        fields=dict(type='list', required=False, default=[]),
+        use_cache=dict(type='bool', required=False, default=False),
+        cache_ttl=dict(type='int', required=False, default=300),
     )
 
     result = dict(
@@ -105,14 +135,16 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
-
-    identity = j.core.identity.find(module.params['identity_name']) if module.params['identity_name'] else j.core.identity.me
-    explorer = identity.explorer
-    try:
-        farm = explorer.farms.get(farm_id=module.params["farm_id"], farm_name=module.params["farm_name"])
-    except j.exceptions.NotFound:
-        module.fail_json(msg=f"farm id: {module.params['farm_id']}, name: {module.params['farm_name']} does not exist")
-    result["ansible_facts"] = {module.params["fact_name"]: farm.to_dict()}
+    instrument(module)
+
+    explorer = get_explorer(module.params['identity_name'])
+    farm = find_cached_farm(explorer, module.params) if module.params["use_cache"] else None
+    if farm is None:
+        try:
+            farm = explorer.farms.get(farm_id=module.params["farm_id"], farm_name=module.params["farm_name"]).to_dict()
+        except j.exceptions.NotFound:
+            module.fail_json(msg=f"farm id: {module.params['farm_id']}, name: {module.params['farm_name']} does not exist")
+    result["ansible_facts"] = {module.params["fact_name"]: project(farm, module.params["fields"])}
 
     module.exit_json(**result)
 
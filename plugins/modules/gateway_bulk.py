@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+DOCUMENTATION = r'''
+---
+module: gateway_bulk
+
+short_description: gateway_bulk module provisions many gateway workloads (subdomains, tcp reverse proxies and 4to6 gateways) in one task
+
+version_added: "1.0.0"
+
+description: gateway_bulk module builds all the gateway workloads, deploys them concurrently with bounded parallelism and waits for all of them together
+
+options:
+    items:
+        description:
+            - list of gateway workloads to create. every item is a dict with a type (subdomain, proxy or 4to6) and the options of the matching module
+            - subdomain items take subdomain and addresses (defaults to the gateway nameservers addresses), proxy items take domain and trc_secret, 4to6 items take public_key
+            - every item can override gateway, pool, description and metadata
+        required: true
+        type: list
+        elements: dict
+    gateway:
+        description: default id of the gateway node for the items
+        required: false
+        type: str
+    pool:
+        description: default id of the pool for the items
+        required: false
+        type: int
+    identity_name:
+        description: identity instance name (if not provided will use the default identity)
+        required: false
+        type: str
+    description:
+        description: default description of the workloads
+        required: false
+        type: str
+    metadata:
+        description: default metadata of the workloads
+        required: false
+        type: str
+    concurrency:
+        description: maximum number of workloads deployed at the same time
+        required: false
+        type: int
+        default: 10
+    wait:
+        description: wait for the workloads to be successful before exit. defaults to True
+        required: False
+        type: bool
+        default: True
+
+
+author:
+    - Ahmed Samir (@AhmedSa-mir)
+'''
+
+EXAMPLES = r'''
+- name: "Expose two tenants"
+  threefold.jsgrid.gateway_bulk:
+    pool: 185
+    gateway: 9PdutHsdDSxcKUUyDg8ovS1KWh47qLT5R9h5uoFgRUH2
+    items:
+      - type: subdomain
+        subdomain: tenant1.webg1test.grid.tf
+      - type: proxy
+        domain: tenant1.webg1test.grid.tf
+        trc_secret: "tenant1-secret"
+      - type: subdomain
+        subdomain: tenant2.webg1test.grid.tf
+      - type: proxy
+        domain: tenant2.webg1test.grid.tf
+        trc_secret: "tenant2-secret"
+  register: result
+'''
+
+RETURN = r'''
+items:
+    description: outcome of every item in the same order as the items option.
+    type: list
+    returned: always
+    sample: "[{'type': 'subdomain', 'wid': 1185, 'success': True, 'message': ''}, {'type': 'proxy', 'wid': None, 'success': False, 'message': 'missing trc_secret'}]"
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import GATEWAY_TYPES, build_gateway
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads
+
+
+def run_module():
+    module_args = dict(
+        items=dict(type='list', elements='dict', required=True),
+        gateway=dict(type='str', required=False),
+        pool=dict(type='int', required=False),
+        identity_name=dict(type='str', required=False),
+        description=dict(type='str', required=False),
+        metadata=dict(type='str', required=False),
+        concurrency=dict(type='int', required=False, default=10),
+        wait=dict(type='bool', required=False, default=True),
+    )
+
+    result = dict(
+        changed=False,
+        items=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+    instrument(module)
+
+    items = []
+    for item in module.params['items']:
+        item = dict(item)
+        for key in ['gateway', 'pool', 'description', 'metadata']:
+            item.setdefault(key, module.params[key])
+        items.append(item)
+
+    invalid = [item.get('type') for item in items if item.get('type') not in GATEWAY_TYPES]
+    if invalid:
+        module.fail_json(msg=f"Unrecognized types: {invalid}. Types allowed are {GATEWAY_TYPES}", **result)
+
+    # every item deploys a new workload
+    if module.check_mode:
+        result['changed'] = bool(items)
+        module.exit_json(**result)
+
+    zos = get_zos(module.params['identity_name'])
+
+    # workloads are built first so that the nameservers of every gateway are resolved only once
+    outcomes = []
+    workloads = []
+    addresses_cache = {}
+    for item in items:
+        outcome = dict(type=item['type'], wid=None, success=False, message="")
+        try:
+            workloads.append((outcome, build_gateway(zos, item, addresses_cache)))
+        except Exception as e:
+            outcome["message"] = str(e)
+        outcomes.append(outcome)
+
+    deployed = deploy_workloads(zos, [workload for _, workload in workloads], module.params['concurrency'], module.params['wait'])
+    for (outcome, _), deployment in zip(workloads, deployed):
+        outcome.update(deployment)
+
+    result["items"] = outcomes
+    result["changed"] = any(outcome["wid"] for outcome in outcomes)
+    failed = [outcome for outcome in outcomes if not outcome["success"]]
+    if failed:
+        module.fail_json(msg=f"{len(failed)} of {len(outcomes)} gateway workloads failed", **result)
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -88,6 +88,7 @@ message:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
 
 EXPLORER_URLS = {
@@ -134,6 +135,7 @@ def run_module():
             ('state', 'absent', ('instance_name',)),
         ],
     )
+    instrument(module)
     
     if module.check_mode:
         module.exit_json(**result)
@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
 import random
 
 DOCUMENTATION = r'''
@@ -87,8 +89,9 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
 
-    zos = j.sals.zos.get(module.params['identity_name'])
+    zos = get_zos(module.params['identity_name'])
     if module.params["operation"] == "get_ip":
         network = zos.network.load_network(module.params["network_name"])
         fact_name = module.params["fact_name"] or "ip_address"
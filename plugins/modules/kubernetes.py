@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_kubernetes, read_ssh_keys
 
 
 
@@ -121,42 +123,25 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
-
-    ssh_keys = []
-
-    for key in module.params["ssh_keys"]:
-        key_path = j.sals.fs.expanduser(key)
-        key_text = j.sals.fs.read_file(key_path)
-        ssh_keys.append(key_text.strip())
-
-    zos = j.sals.zos.get(module.params['identity_name'])
-    if not module.params["master_ip"]:
-        # deploy master
-        k8s = zos.kubernetes.add_master(
-            node_id=module.params["node_id"],
-            network_name=module.params["network_name"],
-            cluster_secret=module.params["cluster_secret"],
-            ip_address=module.params["ip_address"],
-            size=module.params["size"],
-            ssh_keys=ssh_keys,
-            pool_id=module.params["pool_id"],
-            public_ip_wid=module.params["public_ip_wid"],
-        )
-    else:
-        # deploy worker
-        k8s = zos.kubernetes.add_worker(
-            node_id=module.params["node_id"],
-            network_name=module.params["network_name"],
-            cluster_secret=module.params["cluster_secret"],
-            ip_address=module.params["ip_address"],
-            size=module.params["size"],
-            master_ip=module.params["master_ip"],
-            ssh_keys=ssh_keys,
-            pool_id=module.params["pool_id"],
-            public_ip_wid=module.params["public_ip_wid"],
-        )
-    k8s.info.description = module.params['description']
-    k8s.info.description = module.params['metadata']
+    instrument(module)
+
+    ssh_keys = read_ssh_keys(module.params["ssh_keys"])
+
+    zos = get_zos(module.params['identity_name'])
+    k8s = build_kubernetes(
+        zos,
+        node_id=module.params["node_id"],
+        network_name=module.params["network_name"],
+        cluster_secret=module.params["cluster_secret"],
+        ip_address=module.params["ip_address"],
+        size=module.params["size"],
+        ssh_keys=ssh_keys,
+        pool_id=module.params["pool_id"],
+        public_ip_wid=module.params["public_ip_wid"],
+        master_ip=module.params["master_ip"],
+        description=module.params["description"],
+        metadata=module.params["metadata"],
+    )
 
     wid = zos.workloads.deploy(k8s)
 
@@ -0,0 +1,344 @@
+#!/usr/bin/python
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_kubernetes, read_ssh_keys
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import decommission_workloads, deploy_workloads
+from ansible_collections.threefold.jsgrid.plugins.module_utils.network import add_nodes, allocate_ips
+from ansible_collections.threefold.jsgrid.plugins.module_utils.scheduler import select_nodes
+from ansible_collections.threefold.jsgrid.plugins.module_utils.workloads import list_workloads
+import traceback
+
+
+
+DOCUMENTATION = r'''
+---
+module: kubernetes_cluster
+
+short_description: kubernetes cluster module for zos
+
+version_added: "1.0.0"
+
+description:
+    - module to create a kubernetes cluster (one master and its workers) on the TF Grid in one task.
+    - all the VMs are placed in one pass, their nodes are added to the network in a single update and the
+      master and the workers are deployed concurrently since their ips are chosen before deploying.
+    - if the network already has a kubernetes master, the cluster is scaled to the requested number of workers instead.
+      missing workers are added and extra workers (newest first) are decommissioned in parallel under the concurrency window.
+
+options:
+    identity_name:
+        description: identity name to be used to deploy the cluster defaults to j.core.identity.me
+        required: False
+        type: str
+    pool_id:
+        description: capacity pool id to deploy the VMs in
+        required: True
+        type: int
+    network_name:
+        description: name of the network to attach the VMs to. it is created when it doesn't exist and ip_range is specified
+        required: True
+        type: str
+    ip_range:
+        description: ip range of the network in case it has to be created
+        required: False
+        type: str
+    cluster_secret:
+        description: k8s cluster secret passed to zos
+        required: True
+        type: str
+    workers:
+        description: number of workers in the cluster
+        required: False
+        type: int
+        default: 1
+    size:
+        description: k8s vm size as defined in zos
+        required: False
+        type: int
+        default: 1
+    ssh_keys:
+        description: path of public key files to be added to the VMs. when scaling up an existing cluster without them, the workers get the keys of the master
+        required: False
+        type: list
+        default: []
+    public_ip_wid:
+        description: workload id of the public ip to attach to the master
+        required: False
+        type: int
+        default: 0
+    node_ids:
+        description: ids of the nodes to deploy on, the first one is used for the master. the nodes are selected automatically when not specified. when scaling up an existing cluster, one node for every added worker
+        required: False
+        type: list
+    farm_id:
+        description: id of the farm to select the nodes from
+        required: False
+        type: int
+    farm_name:
+        description: name of the farm to select the nodes from
+        required: False
+        type: str
+    country:
+        description: country where the selected nodes are located
+        required: False
+        type: str
+    city:
+        description: city where the selected nodes are located
+        required: False
+        type: str
+    cru:
+        description: how much free cru on the selected nodes
+        required: False
+        type: int
+    mru:
+        description: how much free mru on the selected nodes
+        required: False
+        type: int
+    sru:
+        description: how much free sru on the selected nodes
+        required: False
+        type: int
+    description:
+        description: description of the workloads
+        required: False
+        type: str
+        default: ""
+    metadata:
+        description: metadata of the workloads
+        required: False
+        type: str
+        default: ""
+    concurrency:
+        description: maximum number of VMs deployed or decommissioned at the same time
+        required: False
+        type: int
+        default: 10
+    wait:
+        description: wait for the workloads to be successful before exit. defaults to True
+        required: False
+        type: bool
+        default: True
+
+
+author:
+    - Maged Motawea (@m-motawea)
+'''
+
+EXAMPLES = r'''
+- name: "deploy a cluster with 10 workers"
+  threefold.jsgrid.kubernetes_cluster:
+    pool_id: 149
+    network_name: k8s
+    cluster_secret: password12#$
+    workers: 10
+    size: 1
+    cru: 1
+    mru: 2
+    sru: 50
+    ssh_keys:
+      - "~/.ssh/id_rsa.pub"
+  register: cluster
+
+- name: "scale the cluster down to 4 workers"
+  threefold.jsgrid.kubernetes_cluster:
+    pool_id: 149
+    network_name: k8s
+    cluster_secret: password12#$
+    workers: 4
+  register: cluster
+'''
+
+RETURN = r'''
+master:
+    description: wid, node id, ip address, success and message of the master.
+    type: dict
+    returned: always
+    sample: "{'wid': 1201, 'node_id': '26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY', 'ip': '10.200.2.2', 'success': True, 'message': ''}"
+workers:
+    description: wid, node id, ip address, success and message of every worker.
+    type: list
+    returned: always
+    sample: "[{'wid': 1202, 'node_id': '8zPYak76CXcoZxRoJBjdU69kVjo7XYU1SFE2NEK4UMqn', 'ip': '10.200.3.2', 'success': True, 'message': ''}]"
+added:
+    description: the workers added by this run.
+    type: list
+    returned: always
+removed:
+    description: the workers decommissioned by this run.
+    type: list
+    returned: always
+'''
+
+
+def workload_member(workload):
+    return dict(wid=workload.id, node_id=workload.info.node_id, ip=workload.ipaddress, success=True, message="")
+
+
+def get_cluster(zos, owner_tid, network_name):
+    workloads = list_workloads(zos, owner_tid, ["kubernetes"], {"network_id": network_name})
+    masters = [workload for workload in workloads if not workload.master_ips]
+    workers = [workload for workload in workloads if workload.master_ips]
+    return masters, workers
+
+
+def select_cluster_nodes(zos, params, no_nodes, excluded_nodes):
+    if params["node_ids"]:
+        return params["node_ids"]
+    # one VM per node, skipping the nodes already running VMs of the cluster
+    return select_nodes(
+        zos,
+        no_nodes,
+        network_name=params["network_name"],
+        pool_id=params["pool_id"],
+        farm_id=params["farm_id"],
+        farm_name=params["farm_name"],
+        country=params["country"],
+        city=params["city"],
+        cru=params["cru"],
+        mru=params["mru"],
+        sru=params["sru"],
+        excluded_nodes=excluded_nodes,
+    )
+
+
+def deploy_members(zos, params, ssh_keys, node_ids, master_ip=None):
+    # deploys a master and workers when master_ip is None, workers only otherwise
+    network, _ = add_nodes(
+        zos, params["network_name"], {node_id: None for node_id in node_ids}, params["pool_id"],
+        network_range=params["ip_range"],
+    )
+    ips = allocate_ips(network, node_ids)
+    workloads = []
+    for node_id, ip_address in zip(node_ids, ips):
+        is_master = master_ip is None
+        if is_master:
+            master_ip = ip_address
+        workloads.append(build_kubernetes(
+            zos,
+            node_id=node_id,
+            network_name=params["network_name"],
+            cluster_secret=params["cluster_secret"],
+            ip_address=ip_address,
+            size=params["size"],
+            ssh_keys=ssh_keys,
+            pool_id=params["pool_id"],
+            public_ip_wid=params["public_ip_wid"] if is_master else 0,
+            master_ip=None if is_master else master_ip,
+            description=params["description"],
+            metadata=params["metadata"],
+        ))
+
+    # the workers only need the master ip to join, so they don't have to wait for the master
+    outcomes = deploy_workloads(zos, workloads, params["concurrency"], params["wait"])
+    return [dict(node_id=node_id, ip=ip_address, **outcome) for node_id, ip_address, outcome in zip(node_ids, ips, outcomes)]
+
+
+def run_module():
+    module_args = dict(
+        identity_name=dict(type='str', required=False),
+        pool_id=dict(type='int', required=True),
+        network_name=dict(type='str', required=True),
+        ip_range=dict(type='str', required=False),
+        cluster_secret=dict(type='str', required=True, no_log=True),
+        workers=dict(type='int', required=False, default=1),
+        size=dict(type='int', required=False, default=1),
+        ssh_keys=dict(type='list', required=False, default=[]),
+        public_ip_wid=dict(type='int', required=False, default=0),
+        node_ids=dict(type='list', required=False),
+        farm_id=dict(type='int', required=False),
+        farm_name=dict(type='str', required=False),
+        country=dict(type='str', required=False),
+        city=dict(type='str', required=False),
+        cru=dict(type='int', required=False),
+        mru=dict(type='int', required=False),
+        sru=dict(type='int', required=False),
+        description=dict(type='str', required=False, default=""),
+        metadata=dict(type='str', required=False, default=""),
+        concurrency=dict(type='int', required=False, default=10),
+        # wait for workload flag
+        wait=dict(type='bool', required=False, default=True),
+    )
+
+    result = dict(
+        changed=False,
+        master=None,
+        workers=[],
+        added=[],
+        removed=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+    )
+    instrument(module)
+
+    params = module.params
+    if params["workers"] < 0:
+        module.fail_json(msg="workers can't be negative", **result)
+
+    identity = j.core.identity.find(params['identity_name']) if params['identity_name'] else j.core.identity.me
+    zos = get_zos(params['identity_name'])
+    ssh_keys = read_ssh_keys(params["ssh_keys"])
+
+    try:
+        masters, workers = get_cluster(zos, identity.tid, params["network_name"])
+    except Exception:
+        module.fail_json(msg=traceback.format_exc(), **result)
+
+    if workers and not masters:
+        module.fail_json(
+            msg=f"network {params['network_name']} has {len(workers)} kubernetes workers but no master, "
+            "decommission them or deploy the master first",
+            **result,
+        )
+    if not masters:
+        no_nodes = params["workers"] + 1
+    else:
+        no_nodes = max(params["workers"] - len(workers), 0)
+        result["master"] = workload_member(masters[0])
+    if params["node_ids"] and len(params["node_ids"]) != no_nodes:
+        module.fail_json(msg=f"node_ids must have {no_nodes} nodes, one for every deployed VM", **result)
+
+    workers = sorted(workers, key=lambda workload: workload.id)
+    kept = workers[:params["workers"]]
+    removed = workers[params["workers"]:]
+    result["workers"] = [workload_member(workload) for workload in kept]
+    result["removed"] = [workload_member(workload) for workload in removed]
+
+    try:
+        if removed:
+            result["changed"] = True
+            decommission_workloads(zos, [workload.id for workload in removed], params["concurrency"])
+        if no_nodes:
+            excluded_nodes = [workload.info.node_id for workload in masters + kept]
+            node_ids = select_cluster_nodes(zos, params, no_nodes, excluded_nodes)
+            if masters:
+                # the added workers are reachable with the same keys as the rest of the cluster
+                ssh_keys = ssh_keys or list(masters[0].ssh_keys or [])
+                members = deploy_members(zos, params, ssh_keys, node_ids, masters[0].ipaddress)
+            else:
+                members = deploy_members(zos, params, ssh_keys, node_ids)
+                result["master"] = members.pop(0)
+            result["added"] = members
+            result["workers"] += members
+            result["changed"] = result["changed"] or any(member["wid"] for member in members)
+    except Exception:
+        module.fail_json(msg=traceback.format_exc(), **result)
+
+    members = result["workers"] + [result["master"]]
+    failed = [member for member in members if not member["success"]]
+    if failed:
+        module.fail_json(msg=f"{len(failed)} of {len(members)} kubernetes VMs failed: {failed[0]['message']}", **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
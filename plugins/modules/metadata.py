@@ -70,10 +70,9 @@ message:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
-
-import base64
-from nacl.public import Box
+from ansible_collections.threefold.jsgrid.plugins.module_utils.metadata import decrypt_metadata, encrypt_metadata, identity_box
 
 def run_module():
     module_args = dict(
@@ -97,24 +96,20 @@ def run_module():
             ('state', 'decrypt', ('encrypted_metadata',),)
         ],
     )
+    instrument(module)
 
     identity_name = module.params.get('identity_name', j.core.identity.me.instance_name)
     identity = j.core.identity.get(identity_name)
-    pk = identity.nacl.signing_key.verify_key.to_curve25519_public_key()
-    sk = identity.nacl.signing_key.to_curve25519_private_key()
-    box = Box(sk, pk)
+    box = identity_box(identity)
     if module.params['state'] == 'encrypt':
         try:
-            metadata = j.data.serializers.json.dumps(module.params['metadata'])
-            encrypted_metadata = base64.b85encode(box.encrypt(metadata.encode())).decode()
-            result['message'] = encrypted_metadata
+            result['message'] = encrypt_metadata(box, module.params['metadata'])
         except Exception as e:
             result['message'] = str(e)
             module.fail_json(msg='Failed to encrypt metadata', **result)
     else:
         try:
-            decrypted_metadata = box.decrypt(base64.b85decode(module.params['encrypted_metadata'].encode())).decode()
-            result['message'] = decrypted_metadata
+            result['message'] = decrypt_metadata(box, module.params['encrypted_metadata'])
         except Exception as e:
             result['message'] = str(e)
             module.fail_json(msg='Failed to decrypt metadata', **result)
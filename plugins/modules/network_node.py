@@ -33,13 +33,26 @@ options:
         required: true
         type: int
     nodes:
-        description: A mapping from node ids to ip ranges (range can be anything when adding access). Its length must be one when adding access
+        description: A mapping from node ids to ip ranges (range can be anything when adding access). Its length must be one when adding access. Nodes with an empty range, or a list of node ids, get a free range allocated from the network. All the nodes are added in a single network update.
         required: true
-        type: dict
+        type: raw
+    ip_range:
+        description: The ip range of the network when it's created. Defaults to the /16 containing the first node range.
+        required: false
+        type: str
     ipv4:
         description: The ip version when adding access. Detected automatically when ommited.
         required: false
         type: str
+    topology:
+        description: mesh peers every node with every other node. hub makes the nodes peer only with the hub nodes, so adding a node only redeploys the hubs and the new node. When omitted, the current topology of the network (and its hubs) is kept, new networks are meshed. A hub network where every node still peers with all the others can't be detected, pass topology for it.
+        required: false
+        type: str
+        choices: [mesh, hub]
+    hubs:
+        description: Node ids used as hubs in hub topology. Defaults to the current hubs when the topology is detected, otherwise to the access nodes of the network or, if there are none, two of its public nodes.
+        required: false
+        type: list
 
 author:
     - Omar Elawady (@OmarElawady)
@@ -56,86 +69,57 @@ EXAMPLES = r'''
     identity_name: omar
     type: access
     state: present
+
+- name: Add a node to a network routed through hub nodes
+  network_node:
+    name: management
+    pool_id: 34
+    nodes:
+        FED1ZsfbUz3jcJzzqJWyGaoGC61bdN8coKJNte96Fo7k: 10.100.3.0/24
+    topology: hub
+    hubs:
+        - 26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY
 '''
 
 RETURN = r'''
 changed: False
 wg_config: "config" # in case of adding access
+ranges: {"26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY": "10.100.2.0/24"} # ranges of the added nodes
 '''
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
-from jumpscale.clients.explorer.models import NextAction
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.network import (
+    TOPOLOGIES,
+    add_nodes,
+    apply_topology,
+    changed_node_ids,
+    is_node_in_network,
+    network_signatures,
+    normalize_nodes,
+    resolve_topology,
+    update_network,
+)
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import decommission_workloads
 import traceback
-from time import time
-import netaddr
-
-def wait_until_deployed(zos, wid, expiration=3):
-    start = time()
-
-    while time() - start < expiration * 60:
-        workload = zos.workloads.get(wid)
-        if workload.info.result.workload_id:
-            success = workload.info.result.state.value == 1
-            if success:
-                return True
-            else:
-                error_message = workload.info.result.message
-                raise Exception(f"Failed to add node with workload id {wid} to the network due to the error: {error_message}")    
-    raise TimeoutError(f"Failed to add the node to the network in time. Workload id is {wid}")
-
-def wait_until_decommissioned(zos, wid, expiration=3):
-    start = time()
-
-    while time() - start < expiration * 60:
-        workload = zos.workloads.get(wid)
-        if workload.info.next_action == NextAction.DELETED or workload.info.next_action == NextAction.DELETE:
-            return True
-            
-    raise TimeoutError(f"Failed to decmmission wid {wid}")
-
-
 
-def is_node_in_network(network, node_id):
-    return network.get_node_range(node_id) is not None
-
-def add_network_node(network_name, node_id, ip_range, identity_name, pool_id):
-    zos = j.sals.zos.get(identity_name)
-    network = zos.network.load_network(network_name)
-    if is_node_in_network(network, node_id):
-        return False
-    if network is None:
-        raise Exception(f"The network {network_name} doesn't exist")
-    zos.network.add_node(network, node_id, ip_range, pool_id)
-    update_network(zos, network, [node_id])
-    return True
-
-def get_network_range(subnet):
-    network = netaddr.IPNetwork(subnet)
-    return str(network.supernet(16)[0])
-
-def add_network_nodes(network_name, nodes, identity_name, pool_id):
-    changed = False
-    zos = j.sals.zos.get(identity_name)
-    network = zos.network.load_network(network_name)
-    if network is None:
-        ip_range = get_network_range(list(nodes.values())[0])
-        network = zos.network.create(ip_range, network_name)
-    for node_id, ip_range in nodes.items():
-        if is_node_in_network(network, node_id):
-            continue
-        changed = True
-        zos.network.add_node(network, node_id, ip_range, pool_id)
-    update_network(zos, network, list(nodes.keys()))
-    return changed
+def add_network_nodes(network_name, nodes, identity_name, pool_id, topology=None, hubs=None, network_range=None):
+    zos = get_zos(identity_name)
+    network, changed = add_nodes(zos, network_name, nodes, pool_id, topology, hubs, network_range)
+    ranges = {node_id: str(network.get_node_range(node_id)) for node_id in nodes}
+    return changed, ranges
 
 def is_node_ipv4(node_id):
-    zos = j.sals.zos.get()
+    zos = get_zos()
     return zos.nodes_finder.filter_public_ip4(zos._explorer.nodes.get(node_id))
 
-def add_network_access(network_name, nodes, identity_name, ipv4):
+def add_network_access(network_name, nodes, identity_name, ipv4, topology=None, hubs=None):
     node_id, ip_range = list(nodes.items())[0]
+    if not ip_range:
+        raise Exception("An ip range is required when adding access")
     ipv4 = ipv4 or is_node_ipv4(node_id)
-    zos = j.sals.zos.get(identity_name)
+    zos = get_zos(identity_name)
     network = zos.network.load_network(network_name)
     if not network:
         raise Exception("You have to create the network and add the node to it before making it an access node.")
@@ -143,59 +127,54 @@ def add_network_access(network_name, nodes, identity_name, ipv4):
         raise Exception("You have to add the node to the network before adding it as an access node.")
     if network is None:
         raise Exception(f"The network {network_name} doesn't exist")
+    topology, hubs = resolve_topology(network, topology, hubs)
+    old_signatures = network_signatures(network)
     wg_config = zos.network.add_access(network, node_id, ip_range, ipv4=ipv4)
-    update_network(zos, network, list(nodes.keys()))
+    apply_topology(network, topology, hubs)
+    update_network(zos, network, list(nodes.keys()), changed_node_ids(network, old_signatures))
     return wg_config
 
-def update_network(zos, network, node_ids):
-    wids = []
-    for network_resource in network.network_resources:
-        wids.append(zos.workloads.deploy(network_resource))
-    for wid in wids:
-        workload = zos.workloads.get(wid)
-        timeout = 3 if workload.info.node_id in node_ids else 1
-        try:
-            wait_until_deployed(zos, wid, timeout)
-        except TimeoutError as e:
-            if workload.info.node_id in node_ids:
-                raise e
-
-def decommission_workloads(zos, wids):
-    for wid in wids:
-        zos.workloads.decomission(wid)
-    for wid in wids:
-        wait_until_decommissioned(zos, wid)
-
-def delete_network_nodes(network_name, nodes, identity_name):
+def delete_network_nodes(network_name, nodes, identity_name, topology=None, hubs=None):
     changed = False
-    zos = j.sals.zos.get(identity_name)
+    zos = get_zos(identity_name)
     network = zos.network.load_network(network_name)
     if network is None:
         return False
+    topology, hubs = resolve_topology(network, topology, hubs)
+    old_signatures = network_signatures(network)
     wids = []
     for node_id, _ in nodes.items():
         if is_node_in_network(network, node_id):
             changed = True
             wids += zos.network.delete_node(network, node_id)
+    if not changed:
+        return False
     decommission_workloads(zos, wids)
-    update_network(zos, network, list(nodes.keys()))
+    if hubs:
+        hubs = [node_id for node_id in hubs if node_id not in nodes]
+    apply_topology(network, topology, hubs)
+    update_network(zos, network, list(nodes.keys()), changed_node_ids(network, old_signatures))
     return changed
 
 
 def run_module():
     module_args = dict(
         name=dict(type='str', required=True),
-        nodes=dict(type='dict', required=True),
+        nodes=dict(type='raw', required=True),
+        ip_range=dict(type='str', required=False),
         pool_id=dict(type='int', required=False),
         type=dict(type='str', default='normal'),
         state=dict(type='str', default='present'),
         ipv4=dict(type="bool", required=False),
         identity_name=dict(type='str', required=False),
+        topology=dict(type='str', required=False, choices=TOPOLOGIES),
+        hubs=dict(type='list', required=False),
     )
 
     result = dict(
         changed=False,
-        wg_config=""
+        wg_config="",
+        ranges={},
     )
 
     module = AnsibleModule(
@@ -205,13 +184,19 @@ def run_module():
             ['type', 'state']
         ]
     )
+    instrument(module)
         
     name = module.params.get('name')
     type = module.params.get('type')
     pool_id = module.params.get('pool_id')
     identity_name = module.params.get('identity_name')
     state = module.params.get('state')
-    nodes = module.params.get('nodes')
+    try:
+        nodes = normalize_nodes(module.params.get('nodes'))
+    except Exception as e:
+        module.fail_json(msg=str(e), **result)
+    topology = module.params.get('topology')
+    hubs = module.params.get('hubs')
     
     if type == "access" and len(nodes) != 1:
         module.fail_json(msg="You can add access to exactly one node.", **result)
@@ -223,14 +208,16 @@ def run_module():
             if type == 'access':
                 raise Exception("Deleting access is not supported. Only normal nodes can be removed.")
             else:
-                result['changed'] = delete_network_nodes(name, nodes, identity_name)
+                result['changed'] = delete_network_nodes(name, nodes, identity_name, topology, hubs)
         else:
             if type == "normal":
                 if pool_id is None:
                     raise Exception("Missing required value pool_id when adding a node")
-                result["changed"] = add_network_nodes(name, nodes, identity_name, pool_id)
+                result["changed"], result["ranges"] = add_network_nodes(
+                    name, nodes, identity_name, pool_id, topology, hubs, module.params.get('ip_range')
+                )
             elif type == "access":
-                result["wg_config"] = add_network_access(name, nodes, identity_name, pool_id)
+                result["wg_config"] = add_network_access(name, nodes, identity_name, module.params.get('ipv4'), topology, hubs)
                 result["changed"] = True
             else:
                 raise Exception(f"Unrecognized type: {type}. Types allowed are \"normal\" and \"access\"")
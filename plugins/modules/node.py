@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.catalog import get_items, project
 
 
 DOCUMENTATION = r'''
@@ -23,17 +25,47 @@ options:
         description: node id to search
         required: False
         type: str
+    node_ids:
+        description: node ids to search. they are fetched concurrently, or from the node catalog cache when use_cache is set
+        required: False
+        type: list
     gateway:
         description: If gateway node
         required: False
         type: bool
         default: False
+    fields:
+        description: only return these fields of every node. nested fields are separated by dots e.g. location.country
+        required: False
+        type: list
+    use_cache:
+        description: serve the nodes from the node catalog cached on this machine. the catalog is refreshed when it's older than cache_ttl and many nodes are requested
+        required: False
+        type: bool
+        default: False
+    cache_ttl:
+        description: maximum age of the cached catalog in seconds
+        required: False
+        type: int
+        default: 300
     
 author:
     - Mahmoud Ayoub (@dmahmouali)
     
 '''
 
+EXAMPLES = r'''
+- name: get the location and capacity of many nodes
+  threefold.jsgrid.node:
+    node_ids:
+      - FED1ZsfbUz3jcJzzqJWyGaoGC61bdN8coKJNte96Fo7k
+      - 8zPYak76CXcoZxRoJBjdU69kVjo7XYU1SFE2NEK4UMqn
+    fields:
+      - farm_id
+      - location.country
+      - total_resources
+    use_cache: true
+'''
 
 
 RETURN = r'''
@@ -48,8 +80,12 @@ ansible_facts:
 def run_module():
     module_args = dict(
         identity_name=dict(type='str', required=False),
-        node_id=dict(type='str', required=True),
+        node_id=dict(type='str', required=False),
+        node_ids=dict(type='list', required=False),
         gateway=dict(type='bool', required=False, default=False),
+        fields=dict(type='list', required=False, default=[]),
+        use_cache=dict(type='bool', required=False, default=False),
+        cache_ttl=dict(type='int', required=False, default=300),
     )
 
     result = dict(
@@ -58,21 +94,24 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[('node_id', 'node_ids')],
     )
-
-    zos = j.sals.zos.get(module.params['identity_name'])
-    node = None
-    
-    try:
-        if module.params["gateway"]:
-            node = zos.gateways_finder._gateway.get(module.params["node_id"])
-        else:
-            node = zos.nodes_finder._nodes.get(module.params["node_id"])
-    except Exception as e:
-        module.fail_json(msg=f"{str(e)},\n{module.params}")
-    
-    
-    result["ansible_facts"] = {module.params["node_id"]: node.to_dict()}
+    instrument(module)
+
+    zos = get_zos(module.params['identity_name'])
+    node_ids = list(module.params["node_ids"] or [])
+    if module.params["node_id"]:
+        node_ids.append(module.params["node_id"])
+
+    kind = "gateways" if module.params["gateway"] else "nodes"
+    nodes = get_items(zos._explorer, kind, node_ids, module.params["use_cache"], module.params["cache_ttl"])
+    errors = {node_id: str(error) for node_id, (_, error) in nodes.items() if error is not None}
+    if errors:
+        module.fail_json(msg=f"{errors},\n{module.params}")
+
+    result["ansible_facts"] = {
+        node_id: project(node, module.params["fields"]) for node_id, (node, _) in nodes.items()
+    }
 
     module.exit_json(**result)
 
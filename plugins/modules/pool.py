@@ -1,8 +1,12 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
-import gevent
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.payments import wait_for_payment
+from ansible_collections.threefold.jsgrid.plugins.module_utils.pools import manage_pools, reserve_pool
+from ansible_collections.threefold.jsgrid.plugins.module_utils.stellar import wallet_lock
 
 
 DOCUMENTATION = r'''
@@ -52,6 +56,17 @@ options:
         required: False
         type: bool
         default: True
+    node_ids:
+        description: node ids to extend the pool with
+        required: False
+        type: list
+    pools:
+        description:
+            - list of pools to create or extend in one task. each item takes farm_name or pool_id, cus, sus, ipv4us and node_ids like the single pool options.
+            - all the pools are reserved concurrently then paid one after the other from the wallet and their payments are awaited together.
+        required: False
+        type: list
+        elements: dict
 
 
 author:
@@ -69,6 +84,11 @@ message:
     type: dict
     returned: always
     sample: "{'reservation_id': 3391, 'escrow_information': {'address': 'GCB5JCO44PB7GWXH6MWJMP6DNZKDSYQCSIWDFRP7O3R6B32CL4JNKZXK', 'asset': 'TFT:GBOVQKJYHXRR3DX6NOX2RRYFRCUMSADGDESTDNBDS6CDVLGVESRTAC47', 'amount': 0}}"
+pools:
+    description: outcome of every pool in the same order as the pools option.
+    type: list
+    returned: when pools is specified
+    sample: "[{'pool_id': 3391, 'reservation_id': 3391, 'paid': True, 'error': '', 'message': {...}}]"
 '''
 
 
@@ -83,6 +103,7 @@ def run_module():
         pool_id=dict(type='int', required=False, default=0),  # if sepecified it will extend
         wait=dict(type='bool', required=False, default=True),
         node_ids=dict(type='list', required=False),
+        pools=dict(type='list', elements='dict', required=False),
     )
 
     result = dict(
@@ -94,37 +115,28 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
 
-    zos = j.sals.zos.get(module.params['identity_name'])
+    zos = get_zos(module.params['identity_name'])
     wallet = j.clients.stellar.find(module.params["wallet_name"])
-    
-    if module.params["pool_id"]:
-        pool_info = zos.pools.extend(
-            pool_id=module.params["pool_id"],
-            cu=module.params["cus"],
-            su=module.params["sus"],
-            ipv4us=module.params["ipv4us"],
-            node_ids=module.params["node_ids"],
-        )
-    else:
-        pool_info = zos.pools.create(
-            cu=module.params["cus"],
-            su=module.params["sus"],
-            ipv4us=module.params["ipv4us"],
-            farm=module.params["farm_name"]
-        )
-    
-    zos.billing.payout_farmers(wallet, pool_info)
+
+    if module.params["pools"]:
+        outcomes = manage_pools(zos, wallet, module.params["wallet_name"], module.params["pools"], module.params["wait"])
+        result["pools"] = outcomes
+        result["changed"] = any(outcome["reservation_id"] for outcome in outcomes)
+        failed = [outcome for outcome in outcomes if outcome["error"]]
+        if failed:
+            module.fail_json(msg=f"{len(failed)} of {len(outcomes)} pools failed", **result)
+        module.exit_json(**result)
+
+    pool_info = reserve_pool(zos, module.params)
+    with wallet_lock(module.params["wallet_name"]):
+        zos.billing.payout_farmers(wallet, pool_info)
     
     result["message"] = pool_info.to_dict()
     result["changed"] = True
     if module.params["wait"] and any([module.params["cus"], module.params["sus"], module.params["ipv4us"]]):
-        payment = zos.pools.get_payment_info(pool_info.reservation_id)
-        while payment.expiration.timestamp() > j.data.time.utcnow().timestamp:
-            if payment.paid and any([payment.released, payment.canceled]):
-                break
-            gevent.sleep(2)
-            payment = zos.pools.get_payment_info(pool_info.reservation_id)
+        payment = wait_for_payment(zos, pool_info.reservation_id)
         if not all([payment.paid, payment.released]):
             result["changed"] = False
             result["error"] = payment.cause
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.pools import forecast_pools, manage_pools
+
+
+DOCUMENTATION = r'''
+---
+module: pool_autoextend
+
+short_description: Pool consumption forecast and auto extension module
+
+version_added: "1.0.0"
+
+description: module to project when the pools of an identity expire from their active consumption and extend the ones about to expire to a target runway.
+
+options:
+    identity_name:
+        description: identity name owning the pools. defaults to j.core.identity.me
+        required: False
+        type: str
+    wallet_name:
+        description: wallet name to be used in the payment of the extensions. required unless extend is False or in check mode
+        required: False
+        type: str
+    pool_ids:
+        description: only forecast and extend these pools. defaults to all the pools of the identity
+        required: False
+        type: list
+    runway:
+        description: number of days the extended pools should last with their current consumption
+        required: False
+        type: int
+        default: 30
+    threshold:
+        description: pools expiring in less than this number of days are extended
+        required: False
+        type: int
+        default: 7
+    extend:
+        description: extend the pools expiring within the threshold. when False (or in check mode) only the forecast is returned
+        required: False
+        type: bool
+        default: True
+    wait:
+        description: wait for the payments to be successful before exit
+        required: False
+        type: bool
+        default: True
+
+
+author:
+    - Maged Motawea (@m-motawea)
+'''
+
+EXAMPLES = r'''
+- name: keep every pool funded for the next month
+  threefold.jsgrid.pool_autoextend:
+    wallet_name: mainnet
+    runway: 30
+    threshold: 7
+  register: result
+'''
+
+RETURN = r'''
+forecast:
+    description: forecast of every pool. expires_in is in seconds and null for pools without active consumption. extend holds the units needed to reach the runway.
+    type: list
+    returned: always
+    sample: "[{'pool_id': 3391, 'expires_in': 86400.0, 'expires_at': 1611051640.0, 'remaining_cus': 86400.0, 'remaining_sus': 0.0, 'remaining_ipv4us': 0.0, 'extend': {'cus': 2505600, 'sus': 0, 'ipv4us': 0}}]"
+extended:
+    description: outcome of every extension reservation as returned by the pool module in bulk mode.
+    type: list
+    returned: always
+'''
+
+
+DAY = 24 * 60 * 60
+
+
+def run_module():
+    module_args = dict(
+        identity_name=dict(type='str', required=False),
+        wallet_name=dict(type='str', required=False),
+        pool_ids=dict(type='list', required=False, default=[]),
+        runway=dict(type='int', required=False, default=30),
+        threshold=dict(type='int', required=False, default=7),
+        extend=dict(type='bool', required=False, default=True),
+        wait=dict(type='bool', required=False, default=True),
+    )
+
+    result = dict(
+        changed=False,
+        forecast=[],
+        extended=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+    instrument(module)
+
+    extend = module.params["extend"] and not module.check_mode
+    if extend and not module.params["wallet_name"]:
+        module.fail_json(msg="wallet_name is required to extend the pools", **result)
+
+    zos = get_zos(module.params['identity_name'])
+    pools = zos.pools.list()
+    if module.params["pool_ids"]:
+        pool_ids = [int(pool_id) for pool_id in module.params["pool_ids"]]
+        pools = [pool for pool in pools if pool.pool_id in pool_ids]
+
+    forecasts = forecast_pools(pools, module.params["runway"] * DAY)
+    result["forecast"] = forecasts
+    due = [
+        forecast for forecast in forecasts
+        if forecast["expires_in"] is not None
+        and forecast["expires_in"] < module.params["threshold"] * DAY
+        and any(forecast["extend"].values())
+    ]
+    if not extend or not due:
+        module.exit_json(**result)
+
+    wallet = j.clients.stellar.find(module.params["wallet_name"])
+    if not wallet:
+        module.fail_json(msg=f"Wallet {module.params['wallet_name']} not exists", **result)
+    extensions = [dict(pool_id=forecast["pool_id"], **forecast["extend"]) for forecast in due]
+    outcomes = manage_pools(zos, wallet, module.params["wallet_name"], extensions, module.params["wait"])
+    result["extended"] = outcomes
+    result["changed"] = any(outcome["reservation_id"] for outcome in outcomes)
+    failed = [outcome for outcome in outcomes if outcome["error"]]
+    if failed:
+        module.fail_json(msg=f"{len(failed)} of {len(outcomes)} pool extensions failed", **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
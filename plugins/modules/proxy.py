@@ -85,7 +85,10 @@ message:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_proxy
 
 def run_module():
     module_args = dict(
@@ -108,10 +111,11 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
     
 
     identity_name = module.params.get('identity_name', j.core.identity.me.instance_name)
-    zos = j.sals.zos.get(identity_name)
+    zos = get_zos(identity_name)
 
     gateway_id = module.params['gateway']
     pool_id = module.params['pool']
@@ -120,11 +124,7 @@ def run_module():
     description = module.params['description']
     metadata = module.params['metadata']
 
-    workload = zos.gateway.tcp_proxy_reverse(gateway_id, domain, trc_secret, pool_id)
-    if metadata:
-        workload.info.metadata = metadata
-    if description:
-        workload.info.description = description
+    workload = build_proxy(zos, gateway_id, domain, trc_secret, pool_id, description, metadata)
     wid = zos.workloads.deploy(workload)
     result["changed"] = True
     result.update({"wid": wid, "message": ""})
@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_public_ip
 
 
 
@@ -89,15 +91,17 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
 
-    zos = j.sals.zos.get(module.params['identity_name'])
-    ip = zos.public_ip.create(
+    zos = get_zos(module.params['identity_name'])
+    ip = build_public_ip(
+        zos,
         node_id=module.params['node_id'],
         pool_id=module.params['pool_id'],
-        ipaddress=module.params['ip_address'],
+        ip_address=module.params['ip_address'],
+        description=module.params['description'],
+        metadata=module.params['metadata'],
     )
-    ip.info.description = module.params['description']
-    ip.info.description = module.params['metadata']
     wid = zos.workloads.deploy(ip)
 
     result["changed"] = True
@@ -1,7 +1,10 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.probe import probe_gateways, rank_by_latency
+from ansible_collections.threefold.jsgrid.plugins.module_utils.scheduler import find_nodes, split_by_network
 import random
 
 
@@ -95,6 +98,26 @@ options:
         required: False
         type: bool
         default: True
+    strategy:
+        description: how to order gateway nodes. random (or explorer order if randomize is false), or latency to measure the tcp connect time to every candidate gateway and return the fastest first
+        required: False
+        type: str
+        choices: [random, latency]
+        default: random
+    probe_timeout:
+        description: seconds to wait for a single gateway connection with the latency strategy
+        required: False
+        type: float
+        default: 2
+    probe_total_timeout:
+        description: seconds to wait for probing all the gateways with the latency strategy. gateways which didn't answer are ranked last
+        required: False
+        type: float
+        default: 5
+    network_name:
+        description: prefer nodes that are already part of this network so they can be used without updating the network. nodes whose network resource failed don't count. other nodes are only used when these can't satisfy the query
+        required: False
+        type: str
 
 
 author:
@@ -110,6 +133,16 @@ ansible_facts:
     type: dict
     returned: always
     sample: "{'selected_nodes': ['FED1ZsfbUz3jcJzzqJWyGaoGC61bdN8coKJNte96Fo7k']}"
+network_nodes:
+    description: the selected nodes that are already part of the network specified by network_name and whose network resource is deployed.
+    type: list
+    returned: always
+    sample: "['FED1ZsfbUz3jcJzzqJWyGaoGC61bdN8coKJNte96Fo7k']"
+latencies:
+    description: measured tcp connect time in seconds of every candidate gateway, null when unreachable.
+    type: dict
+    returned: when strategy is latency
+    sample: "{'EwPS7nPZHd5KH6YH7PtbmUpJUyWgseqsqS7cGhjXLUjz': 0.043}"
 '''
 
 
@@ -133,62 +166,59 @@ def run_module():
         randomize=dict(type='bool', required=False, default=True),
         gateway=dict(type='bool', required=False, default=False),
         managed=dict(type='bool', required=False, default=True),
+        network_name=dict(type='str', required=False),
+        strategy=dict(type='str', required=False, default="random", choices=["random", "latency"]),
+        probe_timeout=dict(type='float', required=False, default=2),
+        probe_total_timeout=dict(type='float', required=False, default=5),
     )
 
     result = dict(
         changed=False,
+        network_nodes=[],
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
     )
-
-    zos = j.sals.zos.get(module.params['identity_name'])
-
-    filters = [zos.nodes_finder.filter_is_up, lambda node: node.node_id not in module.params["excluded_nodes"]]
-    if not module.params["gateway"]:
-        if module.params["ip_version"] == "ipv4":
-            filters.append(zos.nodes_finder.filter_public_ip4)
-        elif module.params["ip_version"] == "ipv6":
-            filters.append(zos.nodes_finder.filter_public_ip6)
-        if module.params["public_ip"]:
-            filters.append(zos.nodes_finder.filter_public_ip_bridge)
-
-        nodes = zos.nodes_finder.nodes_by_capacity(
-            farm_id=module.params["farm_id"],
-            farm_name=module.params["farm_name"],
-            country=module.params["country"],
-            city=module.params["city"],
-            cru=module.params["cru"],
-            mru=module.params["mru"],
-            sru=module.params["sru"],
-            hru=module.params["hru"],
-            pool_id=module.params["pool_id"],
-        )
-    else:
-        nodes = zos.gateways_finder.gateways_search(
-            country=module.params["country"],
-            city=module.params["city"],
-        )
-        if module.params["pool_id"]:
-            pool = zos.pools.get(module.params["pool_id"])
-            filters.append(
-                lambda node: node.node_id in pool.node_ids
-            )
-        farm_id = module.params["farm_id"]
-        if not farm_id and module.params["farm_name"]:
-            farm_id = zos._explorer.farms.get(farm_name=module.params["farm_name"])
-        if farm_id:
-            filters.append(lambda node: node.farm_id == farm_id)
-        if module.params["managed"]:
-            filters.append(lambda node: len(node.managed_domains) != 0)
-
-    nodes = list(filter(lambda node: all(f(node) for f in filters), nodes))
+    instrument(module)
+
+    zos = get_zos(module.params['identity_name'])
+
+    nodes = find_nodes(
+        zos,
+        pool_id=module.params["pool_id"],
+        farm_id=module.params["farm_id"],
+        farm_name=module.params["farm_name"],
+        country=module.params["country"],
+        city=module.params["city"],
+        cru=module.params["cru"],
+        mru=module.params["mru"],
+        sru=module.params["sru"],
+        hru=module.params["hru"],
+        ip_version=module.params["ip_version"],
+        public_ip=module.params["public_ip"],
+        excluded_nodes=module.params["excluded_nodes"],
+        gateway=module.params["gateway"],
+        managed=module.params["managed"],
+    )
     if len(nodes) < module.params["no_nodes"]:
         module.fail_json(msg=f"not enough nodes to satisfy query {module.params}")
-    if module.params["randomize"]:
-        random.shuffle(nodes)
-    result["ansible_facts"] = {module.params["query_name"]: [node.node_id for node in nodes[:module.params["no_nodes"]]]}
+    if module.params["network_name"]:
+        in_network, others = split_by_network(zos, nodes, module.params["network_name"])
+    else:
+        in_network, others = [], nodes
+    if module.params["gateway"] and module.params["strategy"] == "latency":
+        latencies = probe_gateways(others, module.params["probe_timeout"], module.params["probe_total_timeout"])
+        result["latencies"] = latencies
+        others = rank_by_latency(others, latencies)
+    elif module.params["randomize"]:
+        random.shuffle(in_network)
+        random.shuffle(others)
+    # nodes already in the network come first so that adding them to the network is a no-op
+    selected = (in_network + others)[:module.params["no_nodes"]]
+    network_node_ids = {node.node_id for node in in_network}
+    result["network_nodes"] = [node.node_id for node in selected if node.node_id in network_node_ids]
+    result["ansible_facts"] = {module.params["query_name"]: [node.node_id for node in selected]}
 
     module.exit_json(**result)
 
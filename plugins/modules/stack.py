@@ -0,0 +1,483 @@
+#!/usr/bin/python
+
+DOCUMENTATION = r'''
+---
+module: stack
+
+short_description: stack module reconciles a set of workloads with a desired manifest
+
+version_added: "1.0.0"
+
+description:
+    - stack module takes the desired workloads of a stack (containers, volumes, zdbs, kubernetes VMs, gateways and public ips)
+      and compares them with the live workloads of the identity. items which are missing are created, items whose spec
+      changed are replaced and live workloads which are no longer in the manifest are decommissioned.
+    - the workloads are tracked with a marker in their description that holds the stack name, the item name and a hash of the item spec.
+      the description of the items can't be set, use the metadata instead.
+    - decommissions run first (containers and VMs before the workloads they use), then the creations run in waves following
+      the dependencies between the items (volume before the containers mounting it, public ip before the VM using it).
+      the workloads of a wave are deployed concurrently, so the time depends on the depth of the dependencies not on the number of workloads.
+    - the nodes of the new containers and VMs are added to the network in a single update before the first wave.
+
+options:
+    name:
+        description: name of the stack. must not contain ':'
+        required: true
+        type: str
+    state:
+        description: present to converge the stack to the items, absent to decommission all the workloads of the stack
+        required: false
+        type: str
+        choices: [present, absent]
+        default: present
+    items:
+        description:
+            - desired workloads. every item is a dict with a unique name, a type and the options of the matching module
+            - container items take node_id, flist and optionally ip_address, env, secret_env, cpu, memory, disk_size, entrypoint, interactive,
+              public_ipv6, storage_url, log_channel (dict with type, host, port and name) and volume_mounts which maps mount points to
+              names of volume items on the same node or to volume workload ids
+            - volume items take node_id, size and optionally disk_type (ssd or hdd, defaults to ssd)
+            - zdb items take node_id, size, mode, password and optionally disk_type (ssd or hdd, defaults to ssd)
+            - kubernetes items take node_id, cluster_secret and optionally ip_address, size, ssh_keys, public_ip (name of a public_ip item on the same node)
+              and master (name of the kubernetes item of the master) or master_ip
+            - public_ip items take node_id and ip_address
+            - subdomain, proxy and 4to6 items take the options of the gateway_bulk items
+            - every item can override pool_id and metadata
+        required: false
+        type: list
+        elements: dict
+        default: []
+    pool_id:
+        description: default capacity pool id of the items
+        required: false
+        type: int
+    network_name:
+        description: network of the containers and kubernetes VMs
+        required: false
+        type: str
+    ip_range:
+        description: ip range of the network in case it has to be created
+        required: false
+        type: str
+    metadata:
+        description: default metadata of the items
+        required: false
+        type: str
+        default: ""
+    identity_name:
+        description: identity instance name (if not provided will use the default identity)
+        required: false
+        type: str
+    concurrency:
+        description: maximum number of workloads deployed or decommissioned at the same time
+        required: false
+        type: int
+        default: 10
+    wait:
+        description: wait for the last wave of workloads to be successful before exit. the other waves are always waited for. defaults to True
+        required: False
+        type: bool
+        default: True
+
+
+author:
+    - Maged Motawea (@m-motawea)
+'''
+
+EXAMPLES = r'''
+- name: "web stack"
+  threefold.jsgrid.stack:
+    name: web
+    pool_id: 149
+    network_name: web
+    ip_range: "10.240.0.0/16"
+    items:
+      - name: data
+        type: volume
+        node_id: 26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY
+        size: 10
+      - name: db
+        type: container
+        node_id: 26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY
+        flist: https://hub.grid.tf/tf-official-apps/postgresql-latest.flist
+        volume_mounts:
+          /var/lib/postgresql: data
+      - name: www
+        type: subdomain
+        gateway: 9PdutHsdDSxcKUUyDg8ovS1KWh47qLT5R9h5uoFgRUH2
+        subdomain: web.webg1test.grid.tf
+  register: result
+
+- name: "remove the stack"
+  threefold.jsgrid.stack:
+    name: web
+    state: absent
+'''
+
+RETURN = r'''
+items:
+    description: action (create, replace or keep) and outcome of every item in the same order as the items option.
+    type: list
+    returned: always
+    sample: "[{'name': 'data', 'type': 'volume', 'action': 'keep', 'wid': 1180, 'success': True, 'message': ''}, {'name': 'db', 'type': 'container', 'action': 'create', 'wid': 1186, 'success': True, 'message': ''}]"
+removed:
+    description: name and workload id of the decommissioned workloads, including the replaced ones.
+    type: list
+    returned: always
+    sample: "[{'name': 'db', 'wid': 1181}]"
+'''
+
+import hashlib
+import json
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import (
+    GATEWAY_TYPES,
+    build_container,
+    build_gateway,
+    build_kubernetes,
+    build_public_ip,
+    build_volume,
+    build_zdb,
+    read_ssh_keys,
+)
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import decommission_workloads, deploy_workloads
+from ansible_collections.threefold.jsgrid.plugins.module_utils.network import add_nodes, allocate_ips
+from ansible_collections.threefold.jsgrid.plugins.module_utils.workloads import index_stack, list_workloads, stack_marker
+
+
+ITEM_TYPES = ["container", "volume", "zdb", "kubernetes", "public_ip"] + GATEWAY_TYPES
+REQUIRED_KEYS = {
+    "container": ["node_id", "flist"],
+    "volume": ["node_id", "size"],
+    "zdb": ["node_id", "size", "mode", "password"],
+    "kubernetes": ["node_id", "cluster_secret"],
+    "public_ip": ["node_id", "ip_address"],
+}
+NETWORK_TYPES = ["container", "kubernetes"]
+# type is the item type, so the disk of volume and zdb items is set by disk_type
+DISK_TYPES = ["ssd", "hdd"]
+# live workloads of these types are decommissioned before the workloads they use
+DEPENDENT_TYPES = ["CONTAINER", "KUBERNETES"]
+
+
+def item_refs(item, names):
+    # maps the names of the items used by this item to whether they have to be deployed before it
+    refs = {}
+    if item["type"] == "container":
+        for vol in (item.get("volume_mounts") or {}).values():
+            if vol in names:
+                refs[vol] = True
+    elif item["type"] == "kubernetes":
+        if item.get("public_ip"):
+            refs[item["public_ip"]] = True
+        if item.get("master"):
+            # the master ip is known before deploying so the workers don't wait for the master
+            refs[item["master"]] = False
+    return refs
+
+
+def validate_items(items):
+    names = set()
+    for item in items:
+        name = item.get("name")
+        if not name or ":" in str(name):
+            raise Exception(f"every item needs a name without ':', got {name}")
+        if name in names:
+            raise Exception(f"duplicate item name {name}")
+        names.add(name)
+        if item.get("type") not in ITEM_TYPES:
+            raise Exception(f"item {name} has an unrecognized type {item.get('type')}. Types allowed are {ITEM_TYPES}")
+        missing = [key for key in REQUIRED_KEYS.get(item["type"], []) if item.get(key) is None]
+        if missing:
+            raise Exception(f"item {name} is missing {', '.join(missing)}")
+        if item["type"] in ["volume", "zdb"] and str(item.get("disk_type", "ssd")).lower() not in DISK_TYPES:
+            raise Exception(f"item {name} has an unrecognized disk_type {item['disk_type']}. Disk types allowed are {DISK_TYPES}")
+        if "description" in item:
+            raise Exception(f"item {name} sets a description which is used to track the stack workloads, use metadata instead")
+
+    items = {item["name"]: item for item in items}
+    for item in items.values():
+        if item["type"] == "container":
+            for mount_point, vol in (item.get("volume_mounts") or {}).items():
+                if vol not in items:
+                    continue
+                if items[vol]["type"] != "volume":
+                    raise Exception(f"item {item['name']} mounts {vol} which isn't a volume")
+                if items[vol]["node_id"] != item["node_id"]:
+                    raise Exception(f"item {item['name']} mounts volume {vol} from another node")
+        elif item["type"] == "kubernetes":
+            public_ip = item.get("public_ip")
+            if public_ip and (public_ip not in items or items[public_ip]["type"] != "public_ip"):
+                raise Exception(f"item {item['name']} uses {public_ip} which isn't a public_ip item")
+            if public_ip and items[public_ip]["node_id"] != item["node_id"]:
+                raise Exception(f"item {item['name']} uses public ip {public_ip} from another node")
+            master = item.get("master")
+            if master and (master not in items or items[master]["type"] != "kubernetes" or items[master].get("master")):
+                raise Exception(f"item {item['name']} uses {master} which isn't a kubernetes master item")
+    return items
+
+
+def spec_hashes(items):
+    # the hash of an item covers the hashes of the items it uses, so replacing an item replaces its users too
+    hashes = {}
+
+    def spec_hash(name):
+        if name not in hashes:
+            refs = {ref: spec_hash(ref) for ref in item_refs(items[name], items)}
+            data = json.dumps([items[name], refs], sort_keys=True, default=str)
+            hashes[name] = hashlib.sha256(data.encode()).hexdigest()[:16]
+        return hashes[name]
+
+    for name in items:
+        spec_hash(name)
+    return hashes
+
+
+def plan_stack(items, index, hashes):
+    # returns the action of every item, the kept live workloads and the live workloads to decommission
+    actions = {}
+    kept = {}
+    removed = []
+    for name in items:
+        live = index.get(name, [])
+        matching = [workload for workload, spec_hash in live if spec_hash == hashes[name]]
+        if matching:
+            actions[name] = "keep"
+            kept[name] = matching[0]
+        else:
+            actions[name] = "replace" if live else "create"
+        removed += [(name, workload) for workload, _ in live if workload is not kept.get(name)]
+    for name, live in index.items():
+        if name not in items:
+            removed += [(name, workload) for workload, _ in live]
+    return actions, kept, removed
+
+
+def create_waves(items, names):
+    depths = {}
+
+    def depth(name):
+        if name not in depths:
+            deps = [ref for ref, ordered in item_refs(items[name], items).items() if ordered and ref in names]
+            depths[name] = 1 + max(depth(dep) for dep in deps) if deps else 0
+        return depths[name]
+
+    waves = {}
+    for name in names:
+        waves.setdefault(depth(name), []).append(name)
+    return [waves[key] for key in sorted(waves)]
+
+
+def workload_ip(workload):
+    if hasattr(workload, "network_connection"):
+        return workload.network_connection[0].ipaddress
+    return workload.ipaddress
+
+
+def assign_ips(zos, params, items, names, replaced):
+    # reuses the ip of the replaced workload on the same node when the item doesn't specify one
+    nodes = {items[name]["node_id"]: None for name in names}
+    if not params["network_name"]:
+        raise Exception("network_name is required for container and kubernetes items")
+    network, _ = add_nodes(zos, params["network_name"], nodes, params["pool_id"], network_range=params["ip_range"])
+    ips = {}
+    for name in names:
+        old = replaced.get(name)
+        if items[name].get("ip_address"):
+            ips[name] = items[name]["ip_address"]
+        elif old is not None and old.info.node_id == items[name]["node_id"]:
+            ips[name] = workload_ip(old)
+        else:
+            continue
+        if ips[name] not in network.used_ips:
+            network.used_ips.append(ips[name])
+    missing = [name for name in names if name not in ips]
+    ips.update(zip(missing, allocate_ips(network, [items[name]["node_id"] for name in missing])))
+    return ips
+
+
+def build_item(zos, params, item, marker, wids, ips, addresses_cache):
+    item_type = item["type"]
+    pool_id = item["pool_id"]
+    metadata = item["metadata"]
+    if item_type == "container":
+        volume_mounts = {}
+        for mount_point, vol in (item.get("volume_mounts") or {}).items():
+            volume_mounts[mount_point] = wids[vol] if vol in wids else vol
+        return build_container(
+            zos,
+            node_id=item["node_id"],
+            network_name=params["network_name"],
+            ip_address=ips[item["name"]],
+            flist=item["flist"],
+            pool_id=pool_id,
+            env=item.get("env"),
+            cpu=item.get("cpu", 1),
+            memory=item.get("memory", 1024),
+            disk_size=item.get("disk_size", 256),
+            entrypoint=item.get("entrypoint", ""),
+            interactive=item.get("interactive", False),
+            secret_env=item.get("secret_env"),
+            public_ipv6=item.get("public_ipv6", False),
+            storage_url=item.get("storage_url", "zdb://hub.grid.tf:9900"),
+            volume_mounts=volume_mounts,
+            log_channel=item.get("log_channel"),
+            description=marker,
+            metadata=metadata,
+        )
+    if item_type == "volume":
+        return build_volume(zos, item["node_id"], pool_id, item["size"], item.get("disk_type", "ssd"), marker, metadata)
+    if item_type == "zdb":
+        return build_zdb(
+            zos, item["node_id"], item["size"], item["mode"], item["password"], pool_id, item.get("disk_type", "ssd").upper(), marker, metadata
+        )
+    if item_type == "kubernetes":
+        return build_kubernetes(
+            zos,
+            node_id=item["node_id"],
+            network_name=params["network_name"],
+            cluster_secret=item["cluster_secret"],
+            ip_address=ips[item["name"]],
+            size=item.get("size", 1),
+            ssh_keys=read_ssh_keys(item.get("ssh_keys") or []),
+            pool_id=pool_id,
+            public_ip_wid=wids[item["public_ip"]] if item.get("public_ip") else item.get("public_ip_wid", 0),
+            master_ip=ips[item["master"]] if item.get("master") else item.get("master_ip"),
+            description=marker,
+            metadata=metadata,
+        )
+    if item_type == "public_ip":
+        return build_public_ip(zos, item["node_id"], pool_id, item["ip_address"], marker, metadata)
+    return build_gateway(zos, dict(item, pool=item.get("pool") or pool_id, description=marker), addresses_cache)
+
+
+def apply_stack(zos, params, items, hashes, actions, kept, removed, outcomes):
+    concurrency = params["concurrency"]
+    dependents = [workload.id for _, workload in removed if workload.info.workload_type.name in DEPENDENT_TYPES]
+    others = [workload.id for _, workload in removed if workload.info.workload_type.name not in DEPENDENT_TYPES]
+    for wids in [dependents, others]:
+        if wids:
+            # replacements reuse the ips and volumes of the removed workloads
+            decommission_workloads(zos, wids, concurrency, deleted=True)
+
+    wids = {name: workload.id for name, workload in kept.items()}
+    ips = {name: workload_ip(workload) for name, workload in kept.items() if items[name]["type"] in NETWORK_TYPES}
+    created = [name for name in items if actions[name] != "keep"]
+    networked = [name for name in created if items[name]["type"] in NETWORK_TYPES]
+    if networked:
+        replaced = {name: workload for name, workload in removed if name in networked}
+        ips.update(assign_ips(zos, params, items, networked, replaced))
+
+    waves = create_waves(items, created)
+    addresses_cache = {}
+    for number, wave in enumerate(waves):
+        names = []
+        workloads = []
+        for name in wave:
+            failed_refs = [ref for ref, ordered in item_refs(items[name], items).items() if ordered and ref not in wids]
+            if failed_refs:
+                outcomes[name]["message"] = f"not deployed because {', '.join(failed_refs)} failed"
+                continue
+            marker = stack_marker(params["name"], name, hashes[name])
+            try:
+                workloads.append(build_item(zos, params, items[name], marker, wids, ips, addresses_cache))
+                names.append(name)
+            except Exception as e:
+                outcomes[name]["message"] = str(e)
+        # the workloads of the next waves use these ones, so every wave but the last is waited for
+        wait = params["wait"] or number < len(waves) - 1
+        for name, outcome in zip(names, deploy_workloads(zos, workloads, concurrency, wait)):
+            outcomes[name].update(outcome)
+            if outcome["success"]:
+                wids[name] = outcome["wid"]
+
+
+def run_module():
+    module_args = dict(
+        name=dict(type='str', required=True),
+        state=dict(type='str', required=False, default='present', choices=['present', 'absent']),
+        items=dict(type='list', elements='dict', required=False, default=[]),
+        pool_id=dict(type='int', required=False),
+        network_name=dict(type='str', required=False),
+        ip_range=dict(type='str', required=False),
+        metadata=dict(type='str', required=False, default=""),
+        identity_name=dict(type='str', required=False),
+        concurrency=dict(type='int', required=False, default=10),
+        wait=dict(type='bool', required=False, default=True),
+    )
+
+    result = dict(
+        changed=False,
+        items=[],
+        removed=[],
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+    instrument(module)
+
+    params = module.params
+    if ":" in params["name"]:
+        module.fail_json(msg="the stack name must not contain ':'", **result)
+
+    desired = [] if params["state"] == "absent" else params["items"]
+    try:
+        items = validate_items([dict(item) for item in desired])
+    except Exception as e:
+        module.fail_json(msg=str(e), **result)
+    for item in items.values():
+        item.setdefault("pool_id", params["pool_id"])
+        item.setdefault("metadata", params["metadata"])
+    hashes = spec_hashes(items)
+
+    identity = j.core.identity.find(params['identity_name']) if params['identity_name'] else j.core.identity.me
+    zos = get_zos(params['identity_name'])
+    try:
+        index = index_stack(list_workloads(zos, identity.tid), params["name"])
+    except Exception:
+        module.fail_json(msg=traceback.format_exc(), **result)
+
+    actions, kept, removed = plan_stack(items, index, hashes)
+    outcomes = {}
+    for name, item in items.items():
+        workload = kept.get(name)
+        outcomes[name] = dict(
+            name=name,
+            type=item["type"],
+            action=actions[name],
+            wid=workload.id if workload else None,
+            success=workload is not None,
+            message="",
+        )
+    result["items"] = list(outcomes.values())
+    result["removed"] = [dict(name=name, wid=workload.id) for name, workload in removed]
+    result["changed"] = bool(removed) or any(action != "keep" for action in actions.values())
+
+    if module.check_mode:
+        module.exit_json(**result)
+
+    try:
+        apply_stack(zos, params, items, hashes, actions, kept, removed, outcomes)
+    except Exception:
+        module.fail_json(msg=traceback.format_exc(), **result)
+
+    failed = [outcome for outcome in outcomes.values() if not outcome["success"]]
+    if failed:
+        module.fail_json(msg=f"{len(failed)} of {len(outcomes)} stack items failed: {failed[0]['message']}", **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -29,9 +29,20 @@ options:
         required: true
         type: str
     subdomain:
-        description: subdomain
-        required: true
+        description: subdomain. required unless subdomains is specified
+        required: false
         type: str
+    subdomains:
+        description:
+            - list of subdomains to create on the same gateway in one task. every item is a subdomain name or a dict with subdomain, addresses, description and metadata keys which default to the module options.
+            - the gateway and its nameserver addresses are fetched once and the subdomains are deployed and awaited concurrently.
+        required: false
+        type: list
+    concurrency:
+        description: maximum number of subdomain workloads deployed at the same time
+        required: false
+        type: int
+        default: 10
     addresses:
         description: list of addresses the subdomain will point to
         required: false
@@ -71,6 +82,18 @@ EXAMPLES = r'''
         metadata:
           test: "test"
     register: result
+
+- name: "Test create many subdomains"
+    subdomain:
+        state: present
+        pool: 185
+        gateway: 9PdutHsdDSxcKUUyDg8ovS1KWh47qLT5R9h5uoFgRUH2
+        subdomains:
+          - app1.webg1test.grid.tf
+          - subdomain: app2.webg1test.grid.tf
+            addresses:
+              - 185.69.166.151
+    register: result
 '''
 
 RETURN = r'''
@@ -82,18 +105,58 @@ message:
     description: message returned in the workload result in case of failures.
     type: str
     returned: always
+subdomains:
+    description: outcome of every subdomain when subdomains is specified.
+    type: list
+    returned: when subdomains is specified
+    sample: "[{'subdomain': 'app1.webg1test.grid.tf', 'wid': 1185, 'success': True, 'message': ''}]"
 '''
 
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_subdomain
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads
+from ansible_collections.threefold.jsgrid.plugins.module_utils.resolver import gateway_addresses
+
+
+def create_subdomains(zos, module, gateway_id, pool_id):
+    items = []
+    for item in module.params['subdomains']:
+        if not isinstance(item, dict):
+            item = dict(subdomain=item)
+        items.append(item)
+    default_addresses = module.params['addresses']
+    if not default_addresses and not all(item.get('addresses') for item in items):
+        default_addresses = gateway_addresses(zos, gateway_id)
+
+    workloads = []
+    for item in items:
+        workloads.append(build_subdomain(
+            zos,
+            gateway_id,
+            item['subdomain'],
+            item.get('addresses') or default_addresses,
+            pool_id,
+            description=item.get('description', module.params['description']),
+            metadata=item.get('metadata', module.params['metadata']),
+        ))
+
+    outcomes = deploy_workloads(zos, workloads, module.params['concurrency'], module.params['wait'])
+    for item, outcome in zip(items, outcomes):
+        outcome["subdomain"] = item['subdomain']
+    return outcomes
 
 def run_module():
     module_args = dict(
         state=dict(type='str', required=True, choices=['present']),
         pool=dict(type='int', required=True),
         gateway=dict(type='str', required=True),
-        subdomain=dict(type='str', required=True),
+        subdomain=dict(type='str', required=False),
+        subdomains=dict(type='list', required=False),
+        concurrency=dict(type='int', required=False, default=10),
         addresses=dict(type='list', required=False),
         identity_name=dict(type='str', required=False),
         description=dict(type='str', required=False),
@@ -109,13 +172,16 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[('subdomain', 'subdomains')],
+        mutually_exclusive=[('subdomain', 'subdomains')],
     )
+    instrument(module)
     
     if module.check_mode:
         module.exit_json(**result)
 
     identity_name = module.params.get('identity_name', j.core.identity.me.instance_name)
-    zos = j.sals.zos.get(identity_name)
+    zos = get_zos(identity_name)
 
     gateway_id = module.params['gateway']
     pool_id = module.params['pool']
@@ -123,15 +189,20 @@ def run_module():
     addresses = module.params['addresses']
     description = module.params['description']
     metadata = module.params['metadata']
+
+    if module.params['subdomains']:
+        outcomes = create_subdomains(zos, module, gateway_id, pool_id)
+        result["subdomains"] = outcomes
+        result["changed"] = any(outcome["wid"] for outcome in outcomes)
+        failed = [outcome for outcome in outcomes if not outcome["success"]]
+        if failed:
+            module.fail_json(msg=f"{len(failed)} of {len(outcomes)} subdomains failed", **result)
+        module.exit_json(**result)
+
     if not addresses:
-        gateway = j.core.identity.me.explorer.gateway.get(gateway_id)
-        addresses = [j.sals.nettools.get_host_by_name(ns) for ns in gateway.dns_nameserver]
-
-    workload = zos.gateway.sub_domain(gateway_id, subdomain, addresses, pool_id)
-    if metadata:
-        workload.info.metadata = metadata
-    if description:
-        workload.info.description = description
+        addresses = gateway_addresses(zos, gateway_id)
+
+    workload = build_subdomain(zos, gateway_id, subdomain, addresses, pool_id, description, metadata)
     wid = zos.workloads.deploy(workload)
     result["changed"] = True
     result.update({"wid": wid, "message": ""})
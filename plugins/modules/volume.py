@@ -1,7 +1,12 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
-from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_volume
+from ansible_collections.threefold.jsgrid.plugins.module_utils.catalog import get_items
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads
+from ansible_collections.threefold.jsgrid.plugins.module_utils.specs import VOLUME_ITEM_SPEC
 
 
 
@@ -13,7 +18,14 @@ short_description: volume module for zos
 
 version_added: "1.0.0"
 
-description: module to create volumes for TF Grid.
+description:
+    - module to create volumes for TF Grid.
+    - with the volumes option many volumes are created concurrently and waited on together. the volumes are grouped by the
+      container they will be mounted in, all the volumes of a group must be on the same node and every node must have enough
+      free capacity for its volumes. both are checked before deploying anything, volumes on a node without enough capacity
+      fail without failing the other volumes.
+    - when batch is true, the collection action plugin coalesces the volume tasks of all the hosts in the play batch into
+      one run of the volumes mode. see the batch option.
 
 options:
     identity_name:
@@ -25,13 +37,26 @@ options:
         required: True
         type: int
     node_id:
-        description: id of the node to deploy the volume on
-        required: True
+        description: id of the node to deploy the volume on. required unless every item of volumes sets it
+        required: False
         type: str
     size:
-        description: size of the volume in GB
-        required: True
+        description: size of the volume in GB. required unless every item of volumes sets it
+        required: False
+        type: int
+    volumes:
+        description:
+            - list of volumes to create. every item is a dict that can set node_id, size, type, description and metadata (defaulting to the module options)
+            - items with a mount_point are returned in volume_mounts under their group (defaults to the node id)
+            - an item that is missing options fails on its own, the other items are still deployed
+        required: False
+        type: list
+        elements: dict
+    concurrency:
+        description: maximum number of volumes deployed at the same time
+        required: False
         type: int
+        default: 10
     type:
         description: disk type for the volume
         required: False
@@ -53,7 +78,19 @@ options:
         required: False
         type: bool
         default: True
-    
+    batch:
+        description:
+            - handled by the action plugin. when true, the task invocations of the hosts in the play batch that run at the same
+              time are deployed by one of them in volumes mode and each host gets its own wid and message back.
+            - the args of every host are validated on their own, a host with invalid args fails without failing the batch.
+            - the batch is deployed with the connection of the first host reaching the task, so it's meant for tasks running on
+              the controller (delegate_to localhost or a local connection). hosts with different identity_name, pool_id, wait
+              or concurrency are deployed by separate runs.
+            - tasks with a loop and tasks using volumes are never batched.
+        required: False
+        type: bool
+        default: False
+
 
 author:
     - Maged Motawea (@m-motawea)
@@ -71,20 +108,115 @@ message:
     description: message returned in the workload result in case of failures.
     type: str
     returned: always
+volumes:
+    description: wid, node id, group, mount point, success and message of every volume in the same order as the volumes option.
+    type: list
+    returned: when volumes is specified
+volume_mounts:
+    description: mapping from group to the volume_mounts option of the container module.
+    type: dict
+    returned: when volumes is specified
+    sample: "{'db': {'/var/lib/postgresql': 1190, '/backups': 1191}}"
+batch_size:
+    description: number of hosts deployed together when the task was batched by the action plugin.
+    type: int
+    returned: when batched
 '''
 
 
+def plan_volumes(items):
+    # checks that the volumes of a group are on one node and that mount points aren't reused in a group
+    group_nodes = {}
+    mounts = set()
+    for item in items:
+        if not item.get("mount_point"):
+            continue
+        group_node = group_nodes.setdefault(item["group"], item["node_id"])
+        if group_node != item["node_id"]:
+            raise Exception(f"volumes of group {item['group']} are on different nodes: {group_node} and {item['node_id']}")
+        if (item["group"], item["mount_point"]) in mounts:
+            raise Exception(f"mount point {item['mount_point']} is used twice in group {item['group']}")
+        mounts.add((item["group"], item["mount_point"]))
+
+
+def check_capacity(zos, items):
+    # returns the error of every node that can't take its volumes
+    required = {}
+    for item in items:
+        resource = "hru" if item["type"].lower() == "hdd" else "sru"
+        key = (item["node_id"], resource)
+        required[key] = required.get(key, 0) + item["size"]
+    nodes = get_items(zos._explorer, "nodes", {node_id for node_id, _ in required}, use_cache=False)
+    errors = {}
+    for (node_id, resource), size in required.items():
+        node, error = nodes[node_id]
+        if error is not None:
+            errors[node_id] = f"Failed to get node {node_id}: {error}"
+            continue
+        free = node["total_resources"][resource] - node["reserved_resources"][resource]
+        if free < size:
+            errors[node_id] = f"node {node_id} has {free} GB of free {resource} while its volumes need {size} GB"
+    return errors
+
+
+def create_volumes(module, zos):
+    # volumes missing options or on nodes without enough capacity fail on their own, the others are still deployed
+    params = module.params
+    items = []
+    errors = {}
+    for index, item in enumerate(params["volumes"]):
+        item = dict(item)
+        for key in ["node_id", "size", "type", "description", "metadata", "pool_id"]:
+            if item.get(key) is None:
+                item[key] = params[key]
+        item.setdefault("mount_point", None)
+        if item.get("group") is None:
+            item["group"] = item["node_id"]
+        missing = [key for key in ["node_id", "size"] if not item.get(key)]
+        if missing:
+            errors[index] = f"volume is missing {', '.join(missing)}"
+        items.append(item)
+    valid = [item for index, item in enumerate(items) if index not in errors]
+    plan_volumes(valid)
+    node_errors = check_capacity(zos, valid)
+    for index, item in enumerate(items):
+        if index not in errors and item["node_id"] in node_errors:
+            errors[index] = node_errors[item["node_id"]]
+
+    deploying = [item for index, item in enumerate(items) if index not in errors]
+    workloads = [
+        build_volume(zos, item["node_id"], item["pool_id"], item["size"], item["type"], item["description"], item["metadata"])
+        for item in deploying
+    ]
+    deployed = iter(deploy_workloads(zos, workloads, params["concurrency"], params["wait"]))
+    volumes = []
+    volume_mounts = {}
+    for index, item in enumerate(items):
+        if index in errors:
+            outcome = dict(wid=None, success=False, message=errors[index])
+        else:
+            outcome = next(deployed)
+        volumes.append(dict(node_id=item["node_id"], group=item["group"], mount_point=item["mount_point"], **outcome))
+        if item["mount_point"] and outcome["success"]:
+            volume_mounts.setdefault(item["group"], {})[item["mount_point"]] = outcome["wid"]
+    return volumes, volume_mounts
+
+
 def run_module():
     module_args = dict(
         identity_name=dict(type='str', required=False),
         pool_id=dict(type='int', required=True),
-        node_id=dict(type='str', required=True),
-        size=dict(type='int', required=True),
+        node_id=dict(type='str', required=False),
+        size=dict(type='int', required=False),
+        volumes=dict(type='list', elements='dict', required=False, options=VOLUME_ITEM_SPEC),
+        concurrency=dict(type='int', required=False, default=10),
         type=dict(type='str', required=False, default='ssd', choices=['ssd', 'hdd']),
         description=dict(type='str', required=False, default=""),
         metadata=dict(type='str', required=False, default=""),
         # wait for workload flag
         wait=dict(type='bool', required=False, default=True),
+        # handled by the action plugin
+        batch=dict(type='bool', required=False, default=False),
     )
 
     result = dict(
@@ -94,17 +226,32 @@ def run_module():
     )
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[['node_id', 'volumes']],
+        required_by={'node_id': 'size'},
     )
+    instrument(module)
+
+    zos = get_zos(module.params['identity_name'])
+    if module.params['volumes']:
+        try:
+            result['volumes'], result['volume_mounts'] = create_volumes(module, zos)
+        except Exception as e:
+            module.fail_json(msg=str(e), **result)
+        result['changed'] = any(volume['wid'] for volume in result['volumes'])
+        failed = [volume for volume in result['volumes'] if not volume['success']]
+        if failed:
+            module.fail_json(msg=f"{len(failed)} of {len(result['volumes'])} volumes failed: {failed[0]['message']}", **result)
+        module.exit_json(**result)
 
-    zos = j.sals.zos.get(module.params['identity_name'])
-    vol = zos.volume.create(
+    vol = build_volume(
+        zos,
         node_id=module.params['node_id'],
         pool_id=module.params['pool_id'],
         size=module.params['size'],
-        type=module.params['type'].upper()
+        type=module.params['type'],
+        description=module.params['description'],
+        metadata=module.params['metadata'],
     )
-    vol.info.description = module.params['description']
-    vol.info.description = module.params['metadata']
     wid = zos.workloads.deploy(vol)
 
     result["changed"] = True
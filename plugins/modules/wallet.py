@@ -29,6 +29,16 @@ options:
         description: wallet secret
         required: False
         type: str
+    balances:
+        description: with list_all, fetch the balances of all the wallets concurrently
+        required: False
+        type: bool
+        default: False
+    balance_ttl:
+        description: seconds a fetched balance is reused by the list_all state, 0 disables the cache. get always fetches the current balance
+        required: False
+        type: int
+        default: 30
 
 requirements:
   - "python"
@@ -49,6 +59,12 @@ EXAMPLES= r'''
     state: "list_all"
     register: result
 
+- name: "Test list all Wallet with balances"
+    wallet:
+    state: "list_all"
+    balances: true
+    register: result
+
 - name: "Test delete Wallet"
     wallet:
     name: "test_mahmoud"
@@ -89,10 +105,22 @@ out:
         test_mainnet,
         vdc_wallet,
     ]
+balances:
+    description: balances of every wallet when listing with balances. wallets whose balance couldn't be fetched are in balance_errors instead
+    type: dict
+    returned: when state is list_all and balances is True
+    sample: {
+        "test_mainnet": {
+            "TFT": "0.0000000",
+            "XLM": "3.5999900"
+        }
+    }
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.stellar import get_balances
 
 
 def _get_balance(wallet):
@@ -108,6 +136,8 @@ def run_module():
         name=dict(type='str', required=False),
         state=dict(type='str', choices=['list_all', 'get', 'new', 'delete'], required=True),
         secret=dict(type='str', required=False),
+        balances=dict(type='bool', required=False, default=False),
+        balance_ttl=dict(type='int', required=False, default=30),
     )
 
     result = dict(
@@ -124,6 +154,7 @@ def run_module():
             ('state', 'delete', ('name',)),
         ],
     )
+    instrument(module)
 
     name = module.params["name"]
     secret = module.params["secret"]
@@ -132,6 +163,13 @@ def run_module():
         wallets_names = j.clients.stellar.list_all()
         result["message"] = "OK"
         result["out"] = wallets_names
+        if module.params["balances"]:
+            wallets = {wallet_name: j.clients.stellar.get(wallet_name) for wallet_name in wallets_names}
+            balances = get_balances(wallets, module.params["balance_ttl"])
+            result["balances"] = {wallet_name: data for wallet_name, (data, error) in balances.items() if error is None}
+            result["balance_errors"] = {
+                wallet_name: str(error) for wallet_name, (_, error) in balances.items() if error is not None
+            }
     
 
     elif module.params["state"] == "get":
@@ -139,7 +177,11 @@ def run_module():
             module.fail_json(msg=f"Wallet {name} not exists", **result)
         wallet = j.clients.stellar.get(name)
         wallet_dict = wallet.to_dict()
-        wallet_dict.update({"balances": _get_balance(wallet)})
+        # no cache here, a balance checked right after a payment must be the current one
+        balances, error = get_balances({name: wallet}, 0)[name]
+        if error is not None:
+            balances = _get_balance(wallet)
+        wallet_dict.update({"balances": balances})
         result["message"] = "OK"
         result["out"] = wallet_dict
     
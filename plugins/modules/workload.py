@@ -1,8 +1,11 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
 from jumpscale.clients.explorer.models import NextAction, WorkloadType
+from ansible_collections.threefold.jsgrid.plugins.module_utils.workloads import filter_workload
 
 
 
@@ -73,19 +76,6 @@ ansible_facts:
 '''
 
 
-def filter_workload(workload, filters):
-    for key, val in filters.items():
-        split_keys = key.split(".")
-        attr = workload
-        for key in split_keys:
-            if not hasattr(attr, key):
-                return False
-            attr = getattr(attr, key)
-        if attr != val:
-            return False
-    return True
-
-
 def run_module():
     next_action_choices = [a.name.lower() for a in NextAction]
     type_choices = [t.name.lower() for t in WorkloadType]
@@ -109,9 +99,10 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
     )
+    instrument(module)
 
     identity = j.core.identity.find(module.params['identity_name']) if module.params['identity_name'] else j.core.identity.me
-    zos = j.sals.zos.get(module.params['identity_name'])
+    zos = get_zos(module.params['identity_name'])
     if not module.params["state"]:
         # gather facts
         if module.params["wid"]:
@@ -1,7 +1,13 @@
 #!/usr/bin/python
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.threefold.jsgrid.plugins.module_utils.timing import instrument
 from jumpscale.loader import j
+from ansible_collections.threefold.jsgrid.plugins.module_utils.explorer import get_zos
+from ansible_collections.threefold.jsgrid.plugins.module_utils.builders import build_zdb
+from ansible_collections.threefold.jsgrid.plugins.module_utils.deploy import deploy_workloads, run_concurrently
+from ansible_collections.threefold.jsgrid.plugins.module_utils.scheduler import spread_storage_nodes
+import math
 
 DOCUMENTATION = r'''
 ---
@@ -34,13 +40,26 @@ options:
         required: true
         type: int
     node:
-        description: id of the node to deploy ZDB on
-        required: true
-        type: int
+        description: id of the node to deploy ZDB on. required unless shards is specified
+        required: false
+        type: str
     size:
-        description: size of the ZDB in GiB
+        description: size of the ZDB in GiB. with shards, the total size split over the shards
         required: true
         type: int
+    shards:
+        description: number of namespaces to create on distinct nodes picked from the node catalog by free hru (HDD) or sru (SSD), spread over as many farms as possible
+        required: false
+        type: int
+    farms:
+        description: ids of the farms to pick the shard nodes from, among the nodes of the pool. defaults to all the farms of the pool
+        required: false
+        type: list
+    concurrency:
+        description: maximum number of namespaces deployed at the same time
+        required: false
+        type: int
+        default: 10
     mode:
         description: ZDB mode (SEQ or USER)
         required: true
@@ -78,6 +97,17 @@ EXAMPLES = r'''
         disk_type: "SSD"
         identity_name: asamir_test
     register: result
+
+- name: "Test create a 16 shards ZDB backend"
+    zdb:
+        state: present
+        pool: 229
+        size: 1600
+        shards: 16
+        mode: "SEQ"
+        password: "secret"
+        disk_type: "HDD"
+    register: result
 '''
 
 RETURN = r'''
@@ -89,15 +119,56 @@ message:
     description: message returned in the workload result in case of failures.
     type: str
     returned: always
+shards:
+    description: wid, node id, farm id, namespace, ips, port, success and message of every shard.
+    type: list
+    returned: when shards is specified
+    sample: "[{'wid': 1190, 'node_id': '26ZATmd3K1fjeQKQsi8Dr7bm9iSRa3ePsV8ubMcbZEuY', 'farm_id': 1, 'namespace': '1190-1', 'ips': ['2a02:1802:5e::223'], 'port': 9900, 'success': True, 'message': ''}]"
 '''
 
 
+def shard_endpoint(workload):
+    data = j.data.serializers.json.loads(workload.info.result.data_json)
+    return dict(namespace=data.get("Namespace"), ips=data.get("IPs", []), port=data.get("Port"))
+
+
+def create_shards(module, zos):
+    params = module.params
+    shard_size = math.ceil(params['size'] / params['shards'])
+    resource = "hru" if params['disk_type'] == "HDD" else "sru"
+    farm_ids = [int(farm_id) for farm_id in params['farms'] or []]
+    # only the nodes of the pool can run its workloads, farms narrows them down
+    node_ids = set(zos.pools.get(params['pool']).node_ids)
+    nodes = spread_storage_nodes(zos._explorer, params['shards'], shard_size, resource, node_ids, farm_ids)
+
+    workloads = [
+        build_zdb(zos, node["node_id"], shard_size, params['mode'], params['password'], params['pool'], params['disk_type'],
+                  params['description'], params['metadata'])
+        for node in nodes
+    ]
+    outcomes = deploy_workloads(zos, workloads, params['concurrency'], params['wait'])
+    shards = [dict(node_id=node["node_id"], farm_id=node["farm_id"], namespace=None, ips=[], port=None, **outcome)
+              for node, outcome in zip(nodes, outcomes)]
+    if params['wait']:
+        succeeded = [shard for shard in shards if shard["success"]]
+        results = run_concurrently(zos.workloads.get, [shard["wid"] for shard in succeeded], params['concurrency'])
+        for shard, (workload, error) in zip(succeeded, results):
+            if error is not None:
+                shard.update(success=False, message=f"Failed to get the result of workload {shard['wid']}: {error}")
+                continue
+            shard.update(shard_endpoint(workload))
+    return shards
+
+
 def run_module():
     module_args = dict(
         state=dict(type='str', required=True, choices=['present']),
         pool=dict(type='int', required=True),
-        node=dict(type='str', required=True),
+        node=dict(type='str', required=False),
         size=dict(type='int', required=True),
+        shards=dict(type='int', required=False),
+        farms=dict(type='list', required=False),
+        concurrency=dict(type='int', required=False, default=10),
         mode=dict(type='str', required=True, choices=['SEQ', 'USER']),
         password=dict(type='str', required=True),
         disk_type=dict(type='str', required=False, choices=['SSD', 'HDD'], default='SSD'),
@@ -116,7 +187,10 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[['node', 'shards']],
+        mutually_exclusive=[['node', 'shards']],
     )
+    instrument(module)
     
    
     pool = module.params['pool']
@@ -126,11 +200,22 @@ def run_module():
     password = module.params['password']
     disk_type = module.params['disk_type']
     identity_name = module.params.get('identity_name', j.core.identity.me.instance_name)
-    zos = j.sals.zos.get(identity_name)
-
-    workload = zos.zdb.create(node, size, mode, password, pool, disk_type)
-    workload.info.description = module.params['description']
-    workload.info.description = module.params['metadata']
+    zos = get_zos(identity_name)
+
+    if module.params['shards'] is not None:
+        if module.params['shards'] < 1:
+            module.fail_json(msg="shards must be at least 1", **result)
+        try:
+            result['shards'] = create_shards(module, zos)
+        except Exception as e:
+            module.fail_json(msg=str(e), **result)
+        result['changed'] = any(shard['wid'] for shard in result['shards'])
+        failed = [shard for shard in result['shards'] if not shard['success']]
+        if failed:
+            module.fail_json(msg=f"{len(failed)} of {len(result['shards'])} shards failed: {failed[0]['message']}", **result)
+        module.exit_json(**result)
+
+    workload = build_zdb(zos, node, size, mode, password, pool, disk_type, module.params['description'], module.params['metadata'])
     wid = zos.workloads.deploy(workload)
     result["changed"] = True
     result.update({"wid": wid, "message": ""})
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import time
+
+from ansible import context
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.plugins.action import ActionBase
+from ansible.utils.vars import merge_hash
+from ansible_collections.threefold.jsgrid.plugins.module_utils.ratelimit import STATE_DIR, SharedState
+
+
+# seconds the leader waits for another host to join before deploying the batch
+BATCH_SETTLE = float(os.environ.get("JSGRID_BATCH_SETTLE", 2))
+# seconds the leader keeps collecting hosts at most
+BATCH_GATHER_TIMEOUT = float(os.environ.get("JSGRID_BATCH_GATHER_TIMEOUT", 30))
+# seconds a host waits for the leader to return its result
+BATCH_TIMEOUT = float(os.environ.get("JSGRID_BATCH_TIMEOUT", 3600))
+BATCH_EXPIRY = 24 * 60 * 60
+POLL_INTERVAL = 0.5
+
+
+class Rendezvous:
+    # every host of the task writes its args in a shared state file. the first host of a round becomes its leader,
+    # closes the round once all the expected hosts joined (or nobody joined for BATCH_SETTLE seconds),
+    # runs the batch and writes back the result of every host. hosts arriving after that start the next round
+    def __init__(self, key, hosts, forks):
+        self.hosts = hosts
+        self.forks = forks
+        path = os.path.join(STATE_DIR, "batches", f"{key}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the args can hold secrets, keep the file private
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self.state = SharedState(path)
+
+    def join(self, host, args):
+        with self.state.locked() as data:
+            round_id = str(data.setdefault("round", 0))
+            current = data.setdefault("rounds", {}).setdefault(round_id, dict(hosts=[], requests={}, results={}))
+            leader = not current["hosts"]
+            current["hosts"].append(host)
+            current["requests"][host] = args
+        return round_id, leader
+
+    def _expected(self, data, round_id):
+        served = sum(len(r["hosts"]) for key, r in data["rounds"].items() if key != round_id)
+        remaining = len(self.hosts) - served
+        return min(remaining, self.forks) if self.forks else remaining
+
+    def gather(self, round_id):
+        start = last_change = time.time()
+        joined = 0
+        while True:
+            with self.state.locked() as data:
+                current = data["rounds"][round_id]
+                if len(current["hosts"]) != joined:
+                    joined = len(current["hosts"])
+                    last_change = time.time()
+                now = time.time()
+                if joined >= self._expected(data, round_id) or now - last_change >= BATCH_SETTLE or now - start >= BATCH_GATHER_TIMEOUT:
+                    data["round"] = int(round_id) + 1
+                    requests, current["requests"] = current["requests"], {}
+                    return requests
+            time.sleep(min(POLL_INTERVAL, BATCH_SETTLE))
+
+    def publish(self, round_id, results):
+        with self.state.locked() as data:
+            data["rounds"][round_id]["results"].update(results)
+
+    def result(self, round_id, host):
+        start = time.time()
+        while time.time() - start < BATCH_TIMEOUT:
+            with self.state.locked() as data:
+                results = data["rounds"][round_id]["results"]
+                if host in results:
+                    return results.pop(host)
+            time.sleep(POLL_INTERVAL)
+        return dict(failed=True, msg=f"timed out waiting {BATCH_TIMEOUT:.0f} seconds for the batch leader")
+
+
+def remove_expired_batches():
+    directory = os.path.join(STATE_DIR, "batches")
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > BATCH_EXPIRY:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class BatchAction(ActionBase):
+    # runs the module once for all the hosts of the play batch reaching the task at the same time.
+    # subclasses set the list option of the module, the spec of its items and the options that must be the same for the whole batch
+    LIST_OPTION = None
+    ITEM_SPEC = None
+    SHARED_OPTIONS = ["identity_name", "wait", "concurrency"]
+    SHARED_SPEC = dict(
+        identity_name=dict(type='str'),
+        wait=dict(type='bool'),
+        concurrency=dict(type='int'),
+    )
+
+    def validate(self, args):
+        # the args of a host are checked and coerced here, so a host with bad args fails alone instead of failing the batch
+        spec = dict(self.ITEM_SPEC)
+        spec.update(self.SHARED_SPEC)
+        validated = ArgumentSpecValidator(spec).validate(args)
+        if validated.error_messages:
+            raise ValueError("; ".join(validated.error_messages))
+        return {key: value for key, value in validated.validated_parameters.items() if value is not None}
+
+    def split_result(self, item):
+        # same result as a module run deploying a single workload
+        result = dict(changed=bool(item["wid"]) and item["success"], wid=item["wid"], message=item["message"])
+        if not item["success"]:
+            result.update(failed=True, msg=item["message"])
+        return result
+
+    def _batch_key(self, hosts):
+        digest = hashlib.sha1(",".join(sorted(hosts)).encode()).hexdigest()[:12]
+        return f"{self._task._uuid}-{digest}"
+
+    def _run_module(self, args, task_vars):
+        return self._execute_module(module_name=self._task.action, module_args=args, task_vars=task_vars)
+
+    def _run_batch(self, requests, task_vars):
+        # hosts with different shared options are deployed by separate module runs
+        groups = {}
+        results = {}
+        for host, request in requests.items():
+            if request.get("error"):
+                results[host] = dict(failed=True, msg=request["error"], changed=False)
+                continue
+            args = request["args"]
+            shared = {key: args.pop(key) for key in self.SHARED_OPTIONS if key in args}
+            groups.setdefault(tuple(sorted(shared.items())), (shared, []))[1].append((host, args))
+
+        for shared, members in groups.values():
+            bulk_args = dict(shared)
+            bulk_args[self.LIST_OPTION] = [args for _, args in members]
+            try:
+                bulk_result = self._run_module(bulk_args, task_vars)
+            except Exception as e:
+                bulk_result = dict(failed=True, msg=str(e))
+            items = bulk_result.get(self.LIST_OPTION) or []
+            for index, (host, args) in enumerate(members):
+                if index < len(items):
+                    result = self.split_result(items[index])
+                else:
+                    result = dict(failed=True, msg=bulk_result.get("msg", "the batch failed"), changed=False)
+                result["batch_size"] = len(members)
+                results[host] = result
+            # the module ran once for the group, its timings are reported by the first host only
+            if "timings" in bulk_result:
+                results[members[0][0]]["timings"] = bulk_result["timings"]
+        return results
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(BatchAction, self).run(tmp, task_vars)
+        del tmp
+        task_vars = task_vars or {}
+
+        args = dict(self._task.args)
+        batch = args.pop("batch", False)
+        hosts = task_vars.get("ansible_play_batch") or []
+        host = task_vars.get("inventory_hostname")
+        if (
+            not batch
+            or len(hosts) < 2
+            or self._task.loop
+            or self._task.loop_with
+            or self._play_context.check_mode
+            or self.LIST_OPTION in args
+        ):
+            return merge_hash(result, self._run_module(args, task_vars))
+
+        rendezvous = Rendezvous(self._batch_key(hosts), hosts, context.CLIARGS.get("forks"))
+        try:
+            request = dict(args=self.validate(args))
+        except ValueError as e:
+            request = dict(error=str(e))
+        # hosts with invalid args still join so the leader doesn't wait for them
+        round_id, leader = rendezvous.join(host, request)
+        if leader:
+            if round_id == "0":
+                remove_expired_batches()
+            requests = rendezvous.gather(round_id)
+            try:
+                results = self._run_batch(requests, task_vars)
+            except Exception as e:
+                results = {member: dict(failed=True, msg=str(e), changed=False) for member in requests}
+            rendezvous.publish(round_id, results)
+        return merge_hash(result, rendezvous.result(round_id, host))